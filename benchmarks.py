@@ -0,0 +1,330 @@
+"""
+Micro-benchmarks of the acquisition and rendering hot paths.
+
+    python benchmarks.py                        run everything and print the results
+    python benchmarks.py --save-baseline        also save the results as the baseline
+    python benchmarks.py --compare              compare with the baseline, exit code 1 on regression
+                                                and 2 when no baseline was saved
+    python benchmarks.py --filter parser --large
+
+Every result is a cost (time per item or per run), lower is better. A result regresses when it is
+more than --threshold (10 % by default) above the baseline. Qt widgets run on the offscreen platform.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import numpy as np
+
+default_baseline = "benchmark_baseline.json"
+default_threshold = 0.10
+# Rows of the synthetic logs loaded by the log loading benchmark, --large adds the 10M rows one
+log_sizes = (10_000, 1_000_000)
+large_log_sizes = (10_000_000,)
+series_sizes = (1_000, 100_000, 1_000_000)
+
+_benchmarks = []
+
+
+def benchmark(function):
+    """
+    Register a benchmark: a function yielding (name, value, unit) results
+    """
+    _benchmarks.append(function)
+    return function
+
+
+def best_of(function, repeat: int = 5) -> float:
+    """
+    Shortest of repeat runs of function, in seconds
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def synthetic_frames(count: int) -> list[bytes]:
+    import protocol_parser
+    rng = np.random.default_rng(0)
+    frames = []
+    for i, value in enumerate(rng.uniform(0.0, 14000.0, count).tolist()):
+        if i % 17 == 0:
+            frames.append(protocol_parser.supply_pressure_frame(value))
+        else:
+            frames.append(protocol_parser.node_pressure_frame(i % 16 + 1, value))
+    return frames
+
+
+# Application shared by every benchmark group, kept referenced for the whole run
+_application = None
+
+
+def qt_application():
+    global _application
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PySide6.QtWidgets import QApplication
+    if _application is None:
+        _application = QApplication.instance() or QApplication(sys.argv[:1])
+    return _application
+
+
+@benchmark
+def parser_benchmarks(args):
+    import protocol_parser
+    count = 100_000
+    frames = synthetic_frames(count)
+    stream = b"".join(frames)
+
+    seconds = best_of(lambda: [protocol_parser.get_data_from_frame(frame) for frame in frames])
+    yield "parser.get_data_from_frame", seconds / count * 1e6, "us/frame"
+
+    def feed():
+        decoder = protocol_parser.FrameDecoder()
+        for offset in range(0, len(stream), 4096):
+            decoder.feed(stream[offset:offset + 4096])
+    seconds = best_of(feed)
+    yield "parser.FrameDecoder.feed", seconds / count * 1e6, "us/frame"
+
+    seconds = best_of(lambda: protocol_parser.decode_frames(stream))
+    yield "parser.decode_frames", seconds / count * 1e9, "ns/frame"
+
+    values = np.random.default_rng(1).uniform(0.0, 14000.0, count).tolist()
+    seconds = best_of(lambda: [protocol_parser.node_pressure_frame(3, value) for value in values])
+    yield "parser.node_pressure_frame", seconds / count * 1e6, "us/frame"
+    seconds = best_of(lambda: [protocol_parser.set_target_pressure(value, 3) for value in values])
+    yield "parser.set_target_pressure", seconds / count * 1e6, "us/frame"
+
+
+@benchmark
+def dispatch_benchmarks(args):
+    """
+    Cost per frame from a decoded batch to the data store, through the same path as live data
+    """
+    qt_application()
+    from PySide6.QtCore import QDateTime
+    import main
+    from serial_reader import decode_batch
+    window = main.MainWindow()
+    now = QDateTime.currentDateTime()
+    frames = synthetic_frames(64)
+    batch, log_lines = decode_batch(now, frames)
+    batch_count = 2000
+
+    def dispatch():
+        for i in range(batch_count):
+            window.update_data(now.addMSecs(i), batch, log_lines)
+    seconds = best_of(dispatch, 3)
+    yield "dispatch.update_data", seconds / (batch_count * len(frames)) * 1e6, "us/frame"
+
+    manager = window._graphManager
+    values = [float(i % 14000) for i in range(100_000)]
+    timestamps = [now.addMSecs(i) for i in range(len(values))]
+
+    def pressure_update():
+        for timestamp, value in zip(timestamps, values):
+            manager.pressureInformationUpdate(1, timestamp, -1.0, -1.0, value)
+    seconds = best_of(pressure_update, 3)
+    yield "dispatch.pressureInformationUpdate", seconds / len(values) * 1e6, "us/frame"
+    window.close()
+
+
+@benchmark
+def chart_benchmarks(args):
+    """
+    Append and cursor lookup versus series size, and the cost of one chart refresh showing the whole series
+    """
+    qt_application()
+    from PySide6.QtCore import QDateTime
+    from graph import CustomChartView
+    start = QDateTime.currentDateTime()
+    for size in series_sizes:
+        chart = CustomChartView("Benchmark", "Time", "Pressure", "s", "mbar", 0.0, 14000.0)
+        chart.resize(1000, 600)
+        chart.show()
+        series = chart._outputPressureSeries
+        buffer = chart._outputPressureData
+        timestamps = start.toMSecsSinceEpoch() + np.arange(size, dtype=np.float64) * 10.0
+        buffer.extend(timestamps, np.random.default_rng(2).uniform(0.0, 14000.0, size))
+
+        appended = [start.addMSecs(size * 10 + i * 10) for i in range(10_000)]
+        seconds = best_of(lambda: [chart.add_pressure_data(series, timestamp, 1.0) for timestamp in appended], 1)
+        yield f"chart.add_pressure_data[{size}]", seconds / len(appended) * 1e6, "us/point"
+
+        lookups = np.random.default_rng(3).uniform(timestamps[0], timestamps[-1], 10_000).tolist()
+        seconds = best_of(lambda: [chart.find_closest_point(x, buffer) for x in lookups])
+        yield f"chart.find_closest_point[{size}]", seconds / len(lookups) * 1e6, "us/lookup"
+
+        first = QDateTime.fromMSecsSinceEpoch(int(buffer.timestamps[0]))
+        last = QDateTime.fromMSecsSinceEpoch(int(buffer.timestamps[-1]))
+        chart.set_follow_live(False)
+        chart.refresh_chart()
+        chart._x_axis.setRange(first, last)
+
+        def refresh():
+            chart.redraw_all_series()
+            chart.refresh_chart()
+        seconds = best_of(refresh)
+        yield f"chart.refresh_chart[{size}]", seconds * 1e3, "ms/refresh"
+        chart.close()
+        chart.deleteLater()
+
+
+@benchmark
+def logging_benchmarks(args):
+    """
+    CSV logging of a graph: cost of queuing a row on the GUI thread and end to end rate until written
+    """
+    qt_application()
+    from PySide6.QtCore import QDateTime
+    from graph import GraphDialog
+    from csv_log_writer import CsvLogWriter
+    count = 200_000
+    now = QDateTime.currentDateTime()
+    timestamps = [now.addMSecs(i) for i in range(count)]
+    with tempfile.TemporaryDirectory() as directory:
+        writer = CsvLogWriter(directory)
+        dialog = GraphDialog("Benchmark Node 1", 1, "Time", "Pressure", "s", "mbar", 0.0, 14000.0, log_writer=writer)
+        dialog.log_saving()
+        start = time.perf_counter()
+        for timestamp in timestamps:
+            dialog.log_pressure_data(timestamp, 8000.0, 3000.0, 2999.5)
+        queued = time.perf_counter() - start
+        writer.close()
+        written = time.perf_counter() - start
+        dialog.deleteLater()
+    yield "logging.log_pressure_data", queued / count * 1e6, "us/row"
+    yield "logging.written", written / count * 1e6, "us/row"
+
+
+def write_synthetic_log(path: str, rows: int) -> None:
+    """
+    Log in the format of CsvLogWriter, rows 10 ms apart, written in blocks to keep generation fast
+    """
+    from csv_log_writer import format_timestamp
+    start_ms = time.time() * 1000
+    block = 100_000
+    rng = np.random.default_rng(4)
+    with open(path, "w", newline="") as log_file:
+        for first in range(0, rows, block):
+            count = min(block, rows - first)
+            base = start_ms + first * 10
+            # Timestamps are formatted once per second and completed with the milliseconds
+            seconds = {}
+            outputs = rng.uniform(0.0, 14000.0, count)
+            lines = []
+            for i in range(count):
+                timestamp_ms = base + i * 10
+                second = int(timestamp_ms // 1000)
+                prefix = seconds.get(second)
+                if prefix is None:
+                    prefix = seconds[second] = format_timestamp(second * 1000)[:-3]
+                lines.append(f"{prefix}{int(timestamp_ms % 1000):03d},8000.00,{outputs[i]:.2f},3000.00\r\n")
+            log_file.write("".join(lines))
+
+
+@benchmark
+def log_loading_benchmarks(args):
+    """
+    Time to open a log: chunked parsing off the GUI thread and bulk appends to the graph, as onOpenLog does
+    """
+    qt_application()
+    from PySide6.QtCore import QEventLoop
+    from graph import GraphDialog
+    from log_loader import LogLoader
+    sizes = log_sizes + (large_log_sizes if args.large else ())
+    with tempfile.TemporaryDirectory() as directory:
+        for rows in sizes:
+            path = os.path.join(directory, f"log_{rows}.csv")
+            write_synthetic_log(path, rows)
+
+            def load():
+                dialog = GraphDialog(path, 0, "Time", "Pressure", "s", "mbar", 0.0, 14000.0)
+                loader = LogLoader(path)
+                loader.chunkLoadedSignal.connect(dialog.load_pressure_data)
+                loop = QEventLoop()
+                loader.loadFinishedSignal.connect(loop.quit)
+                loader.start()
+                loop.exec()
+                loader.wait()
+                dialog.show_all_data()
+                dialog.deleteLater()
+            seconds = best_of(load, 3 if rows < 1_000_000 else 1)
+            yield f"log_loading.open[{rows}]", seconds, "s"
+            os.remove(path)
+
+
+def run(args) -> dict:
+    results = {}
+    for function in _benchmarks:
+        if args.filter and args.filter not in function.__name__:
+            continue
+        for name, value, unit in function(args):
+            results[name] = {"value": value, "unit": unit}
+            print(f"{name:45s} {value:12.3f} {unit}", flush=True)
+    return results
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list[str]:
+    """
+    Names of the results more than threshold above their baseline, printing the ratio of every result
+    """
+    regressions = []
+    print(f"\n{'benchmark':45s} {'baseline':>12s} {'current':>12s} {'ratio':>8s}")
+    for name, result in results.items():
+        reference = baseline.get("results", {}).get(name)
+        if reference is None:
+            print(f"{name:45s} {'-':>12s} {result['value']:12.3f} {'new':>8s}")
+            continue
+        ratio = result["value"] / reference["value"] if reference["value"] else float("inf")
+        flag = ""
+        if ratio > 1.0 + threshold:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:45s} {reference['value']:12.3f} {result['value']:12.3f} {ratio:8.2f}{flag}")
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Micro-benchmarks of the acquisition and rendering hot paths")
+    parser.add_argument("--filter", default=None, help="only run the benchmark groups whose name contains this text")
+    parser.add_argument("--large", action="store_true", help="also load a 10M rows log")
+    parser.add_argument("--baseline", default=default_baseline, help="baseline file")
+    parser.add_argument("--save-baseline", action="store_true", help="save the results as the baseline")
+    parser.add_argument("--compare", action="store_true", help="compare the results with the baseline")
+    parser.add_argument("--threshold", type=float, default=default_threshold,
+                        help="relative slowdown above which a result is a regression")
+    args = parser.parse_args()
+
+    # The baseline is read before running the suite, which takes minutes, so a missing one fails right away
+    baseline = None
+    if args.compare:
+        try:
+            with open(args.baseline) as baseline_file:
+                baseline = json.load(baseline_file)
+        except FileNotFoundError:
+            print(f"No baseline {args.baseline}, save one first with --save-baseline", file=sys.stderr)
+            return 2
+    results = run(args)
+    regressions = []
+    if baseline is not None:
+        regressions = compare(results, baseline, args.threshold)
+    if args.save_baseline:
+        saved = {"python": sys.version.split()[0], "machine": platform.machine(),
+                 "platform": platform.platform(), "results": results}
+        with open(args.baseline, "w") as baseline_file:
+            json.dump(saved, baseline_file, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) above {args.threshold:.0%}: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
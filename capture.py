@@ -0,0 +1,115 @@
+import struct
+import threading
+import time
+import numpy as np
+import protocol_parser
+
+# File layout: a 32 byte header followed by fixed size records, all little endian.
+# Header: magic, format version, record size, frame length, port slot, start time (ns since epoch).
+# The port slot of the controller recorded is 0 in files written before it was stored.
+# Record: receive timestamp (ns since epoch) followed by the raw frame as received.
+capture_magic = b"PPCP"
+capture_version = 1
+capture_extension = ".ppcap"
+_header = struct.Struct('<4sHHHHq12x')
+header_size = _header.size
+
+
+def capture_dtype(frame_length: int = protocol_parser.default_frame_length) -> np.dtype:
+    """
+    NumPy record type of a capture, used both to write records and to map a file
+    """
+    return np.dtype([('timestamp_ns', '<u8'), ('frame', 'u1', (frame_length,))])
+
+
+class CaptureWriter:
+    """
+    Raw capture of the serial link.
+    Every received frame is written with a high resolution receive timestamp into a fixed record
+    binary file, so a session can be recorded at full link rate and reprocessed later without loss.
+    Timestamps come from the performance counter anchored on the wall clock at creation,
+    so they have sub-microsecond resolution and never go backwards.
+    write() is meant to be called from the acquisition thread only, writes are buffered by the file object.
+    port_slot is the one of the controller recorded, its frames carrying the node ids of that controller only.
+    """
+    def __init__(self, path: str, frame_length: int = protocol_parser.default_frame_length, port_slot: int = 0):
+        self.path = path
+        self.port_slot = port_slot
+        self._dtype = capture_dtype(frame_length)
+        self._frameLength = frame_length
+        self._startNs = time.time_ns()
+        self._startPerfNs = time.perf_counter_ns()
+        self._lock = threading.Lock()
+        self.frame_count = 0
+        self._file = open(path, 'wb')
+        self._file.write(_header.pack(capture_magic, capture_version, self._dtype.itemsize,
+                                      frame_length, port_slot, self._startNs))
+
+    def now_ns(self) -> int:
+        """
+        Current time in ns since epoch, on the clock of the capture
+        """
+        return self._startNs + time.perf_counter_ns() - self._startPerfNs
+
+    def write(self, frames: list, receive_ns: int = None) -> None:
+        """
+        Append frames received together, they all get the same receive timestamp
+        """
+        count = len(frames)
+        if count == 0:
+            return
+        records = np.empty(count, dtype=self._dtype)
+        records['timestamp_ns'] = self.now_ns() if receive_ns is None else receive_ns
+        records['frame'] = np.frombuffer(b"".join(frames), dtype=np.uint8).reshape(count, self._frameLength)
+        with self._lock:
+            if self._file is not None:
+                self._file.write(records.tobytes())
+                self.frame_count += count
+
+    def flush(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                # The file is forgotten even when flushing its last records fails, e.g. on a full disk
+                file, self._file = self._file, None
+                file.close()
+
+
+def read_header(path: str) -> dict:
+    """
+    Read and check the header of a capture file
+    Raises ValueError when the file is not a capture or has an unsupported version
+    """
+    with open(path, 'rb') as capture_file:
+        data = capture_file.read(header_size)
+    if len(data) < header_size:
+        raise ValueError(f"{path} is too short to be a capture")
+    magic, version, record_size, frame_length, port_slot, start_ns = _header.unpack(data)
+    if magic != capture_magic:
+        raise ValueError(f"{path} is not a capture")
+    if version != capture_version:
+        raise ValueError(f"Unsupported capture version {version}")
+    if record_size != capture_dtype(frame_length).itemsize:
+        raise ValueError(f"Inconsistent record size {record_size} in {path}")
+    return {"version": version, "record_size": record_size,
+            "frame_length": frame_length, "port_slot": port_slot, "start_ns": start_ns}
+
+
+def open_capture(path: str) -> tuple[dict, np.ndarray]:
+    """
+    Map a capture file without reading it.
+    Returns the header and a read only record array with timestamp_ns and frame fields.
+    A partial record at the end, left by an interrupted recording, is ignored.
+    """
+    header = read_header(path)
+    dtype = capture_dtype(header["frame_length"])
+    with open(path, 'rb') as capture_file:
+        capture_file.seek(0, 2)
+        count = (capture_file.tell() - header_size) // dtype.itemsize
+    if count == 0:
+        return header, np.empty(0, dtype=dtype)
+    return header, np.memmap(path, dtype=dtype, mode='r', offset=header_size, shape=(count,))
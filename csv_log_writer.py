@@ -0,0 +1,159 @@
+import csv
+import os
+import queue
+import re
+import sys
+import threading
+import time
+from datetime import datetime
+
+# Default flush policy: buffered rows reach the OS at least this often, fsync is optional
+default_flush_interval_s = 1.0
+default_fsync = False
+
+# Queue markers
+_FLUSH = object()
+_STOP = object()
+
+
+def _print_error(path: str, error: Exception) -> None:
+    print(f"Can not write {path}: {error}", file=sys.stderr, flush=True)
+
+
+def format_timestamp(timestamp_ms: float) -> str:
+    """
+    Local time with milliseconds as written in the logs, e.g. 2026-10-16T08:30:00.125
+    """
+    return datetime.fromtimestamp(timestamp_ms / 1000).isoformat(timespec='milliseconds')
+
+
+class CsvLogWriter:
+    """
+    Background CSV writer.
+    Rows are queued by the caller and written by a dedicated thread, so logging never blocks the GUI.
+    Every log name gets exactly one file per session, named after the session start time,
+    opened on its first row and kept open until close().
+    Files are flushed every flush_interval_s and on flush(), and also fsynced if fsync is set.
+    close() drains the queue before returning, so no queued row is lost on exit.
+    Rows are (timestamp, supply pressure, output pressure, target pressure).
+    A file which can not be opened or written is reported once through on_error(path, error), called from the
+    writer thread and printing to stderr by default, then closed and the following rows of its log are dropped.
+    """
+    def __init__(self, directory: str = ".",
+                 flush_interval_s: float = default_flush_interval_s,
+                 fsync: bool = default_fsync, on_error=None):
+        self._directory = directory
+        self._flushInterval = flush_interval_s
+        self._fsync = fsync
+        self._session = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+        self._queue = queue.SimpleQueue()
+        # log name -> (file, csv writer), only touched by the writer thread
+        self._files = {}
+        # Log names whose file failed, their rows are dropped
+        self._failed = set()
+        self._onError = on_error or _print_error
+        self._thread = threading.Thread(target=self._run, name="csv-log-writer", daemon=True)
+        self._thread.start()
+
+    def path_for(self, name: str) -> str:
+        """
+        File of a log name for the current session
+        """
+        safe_name = re.sub(r'[\\/:*?"<>|]', "_", name)
+        return os.path.join(self._directory, f"{self._session}_{safe_name}.csv")
+
+    def write(self, name: str, timestamp_ms: float, supply_pressure: float, output_pressure: float, target_pressure: float) -> None:
+        """
+        Queue one row of a log, negative pressures meaning no update as in the rest of the application
+        """
+        self._queue.put((name, timestamp_ms, supply_pressure, output_pressure, target_pressure))
+
+    def flush(self) -> None:
+        """
+        Ask the writer thread to flush every file once the rows queued so far are written
+        """
+        self._queue.put(_FLUSH)
+
+    def close(self) -> None:
+        """
+        Write every queued row, flush and close all files and stop the writer thread
+        """
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join()
+
+    def _file(self, name: str):
+        entry = self._files.get(name)
+        if entry is None:
+            csv_file = open(self.path_for(name), 'a', newline='')
+            entry = self._files[name] = (csv_file, csv.writer(csv_file))
+        return entry
+
+    def _fail(self, name: str, error: OSError) -> None:
+        """
+        Report a log whose file failed and stop writing it
+        """
+        self._failed.add(name)
+        entry = self._files.pop(name, None)
+        if entry is not None:
+            try:
+                entry[0].close()
+            except OSError:
+                pass
+        self._onError(self.path_for(name), error)
+
+    def _flush_files(self) -> None:
+        for name, (csv_file, _) in list(self._files.items()):
+            try:
+                csv_file.flush()
+                if self._fsync:
+                    os.fsync(csv_file.fileno())
+            except OSError as e:
+                self._fail(name, e)
+
+    def _run(self) -> None:
+        """
+        Writer loop: write everything queued at once, then flush when the interval elapsed or when asked to
+        """
+        last_flush = time.monotonic()
+        running = True
+        # Rows of a batch of frames share their timestamp, so the last one formatted is reused
+        last_timestamp_ms = None
+        timestamp = ""
+        while running:
+            try:
+                items = [self._queue.get(timeout=self._flushInterval)]
+            except queue.Empty:
+                items = []
+            while True:
+                try:
+                    items.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            flush_requested = False
+            for item in items:
+                if item is _STOP:
+                    running = False
+                elif item is _FLUSH:
+                    flush_requested = True
+                else:
+                    name, timestamp_ms, supply_pressure, output_pressure, target_pressure = item
+                    if name in self._failed:
+                        continue
+                    if timestamp_ms != last_timestamp_ms:
+                        last_timestamp_ms = timestamp_ms
+                        timestamp = format_timestamp(timestamp_ms)
+                    try:
+                        self._file(name)[1].writerow((timestamp,
+                                                      format(supply_pressure, ".2f"),
+                                                      format(output_pressure, ".2f"),
+                                                      format(target_pressure, ".2f")))
+                    except OSError as e:
+                        self._fail(name, e)
+            if flush_requested or time.monotonic() - last_flush >= self._flushInterval:
+                self._flush_files()
+                last_flush = time.monotonic()
+        self._flush_files()
+        for csv_file, _ in self._files.values():
+            csv_file.close()
+        self._files.clear()
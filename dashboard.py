@@ -0,0 +1,312 @@
+"""
+Dashboard of every node in one window: a grid of small sparklines of the output and target pressure.
+
+The whole grid is a single widget painting every cell with QPainter, instead of one QChart with its scene,
+axes and gradient background per node. Samples are read from the NodeDataStore through LevelOfDetail, at
+most one point per pixel column of a cell. Painting is batched per pen: the static part (cell frames and names)
+is a cached pixmap, then the target traces of every cell are one path of a polygon per cell, drawn with a single
+call, the output traces another one, then the values. Only the cells in the exposed region
+are drawn, so scrolling through hundreds of nodes costs the visible cells only.
+"""
+import bisect
+import time
+import numpy as np
+from PySide6.QtWidgets import (QDialog, QWidget, QVBoxLayout, QHBoxLayout, QScrollArea, QComboBox,
+                               QCheckBox, QLabel)
+from PySide6.QtGui import (QPainter, QPainterPath, QPolygonF, QPen, QColor, QFont, QPixmap)
+from PySide6.QtCore import (Qt, QPointF, QRect, QRectF, QTimer, Signal, Slot)
+import style_sheet
+import perf_stats
+import protocol_parser
+from node_data_store import NodeDataStore
+from level_of_detail import LevelOfDetail
+
+# Time windows offered to the user: label -> span in ms
+dashboard_windows = {"30 s": 30_000, "1 min": 60_000, "5 min": 5 * 60_000, "15 min": 15 * 60_000}
+
+output_color = QColor("#1E90FF")
+target_color = QColor("#50fa7b")
+_background_color = QColor("#1f1f29")
+_cell_color = QColor("#2b2b3a")
+_text_color = QColor("white")
+_stale_color = QColor("#777777")
+
+
+def polyline_path(xs: list, ys: list) -> QPainterPath:
+    """
+    One path made of a polyline per pair of coordinate arrays, so drawing the traces of every cell is a single call.
+    Each polyline holds at most one point per pixel column of its cell, the points of the visible cells only.
+    """
+    path = QPainterPath()
+    for x, y in zip(xs, ys):
+        path.addPolygon(QPolygonF(list(map(QPointF, x.tolist(), y.tolist()))))
+    return path
+
+
+class SparklineGrid(QWidget):
+    """
+    Grid of one cell per node showing its output and target pressure over the last window_ms, the last target
+    being held up to the end of the window.
+    Every cell shares the same time range, ending at the newest sample of any node, so the nodes can be
+    compared at a glance. Each cell scales its pressure axis to its visible samples unless autoscale is off,
+    the range given at construction being used then. A node which sent nothing within the window shows its
+    last value greyed out.
+    The grid is repainted at most refresh_rate_hz times per second, and only when a buffer changed.
+    Double clicking a cell emits nodeActivatedSignal with its node id.
+    """
+    nodeActivatedSignal = Signal(int)
+
+    refresh_rate_hz = 10
+    min_cell_width = 200
+    cell_height = 72
+    cell_spacing = 4
+    _header_height = 16
+
+    def __init__(self, data_store: NodeDataStore, min_y_range: float = 0.0, max_y_range: float = 100.0,
+                 y_axis_unit: str = "", parent=None):
+        super().__init__(parent)
+        self._dataStore = data_store
+        self._min_y_range = min_y_range
+        self._max_y_range = max_y_range
+        self._y_axis_unit = y_axis_unit
+        self._autoscale = True
+        self.window_ms = dashboard_windows["1 min"]
+        # Node ids in display order, with the output and target buffers of each and their level of detail views
+        self._nodeIds = []
+        self._traces = {}
+        # Buffer versions last painted, so an idle grid is not repainted
+        self._paintedVersions = None
+        self._columns = 1
+        self._background = None
+        self._labelFont = QFont("Segoe UI", 8)
+        self._valueFont = QFont("Segoe UI", 8, QFont.Bold)
+        self.setAttribute(Qt.WA_OpaquePaintEvent)
+
+        self._refreshTimer = QTimer(self)
+        self._refreshTimer.timeout.connect(self.refresh)
+        self._refreshTimer.start(1000 // self.refresh_rate_hz)
+
+    def add_node(self, node_id: int) -> None:
+        """
+        Add the cell of a node, kept in node id order
+        """
+        node = self._dataStore.node(node_id)
+        if node is None or node_id in self._traces:
+            return
+        bisect.insort(self._nodeIds, node_id)
+        self._traces[node_id] = (node.output, LevelOfDetail(node.output), node.target, LevelOfDetail(node.target))
+        self.update_layout()
+
+    def set_window(self, window_ms: float) -> None:
+        self.window_ms = window_ms
+        self.update()
+
+    def set_autoscale(self, enabled: bool) -> None:
+        self._autoscale = enabled
+        self.update()
+
+    def update_layout(self) -> None:
+        """
+        Fit as many columns as the width allows, the height following the number of rows
+        """
+        self._columns = max(1, (self.width() + self.cell_spacing) // (self.min_cell_width + self.cell_spacing))
+        rows = -(-len(self._nodeIds) // self._columns)
+        self.setMinimumHeight(rows * (self.cell_height + self.cell_spacing))
+        self._background = None
+        self._paintedVersions = None
+        self.update()
+
+    def cell_rect(self, index: int) -> QRect:
+        spacing = self.cell_spacing
+        width = (self.width() + spacing) // self._columns - spacing
+        row, column = divmod(index, self._columns)
+        return QRect(column * (width + spacing), row * (self.cell_height + spacing), width, self.cell_height)
+
+    def node_at(self, x: int, y: int):
+        """
+        Node id of the cell under a position, None between cells or below the last one
+        """
+        row = y // (self.cell_height + self.cell_spacing)
+        column = min(x // ((self.width() + self.cell_spacing) // self._columns), self._columns - 1)
+        index = row * self._columns + column
+        if 0 <= index < len(self._nodeIds) and self.cell_rect(index).contains(x, y):
+            return self._nodeIds[index]
+        return None
+
+    @Slot()
+    def refresh(self) -> None:
+        """
+        Repaint when a buffer changed since the last paint. Nothing is done while the grid is hidden.
+        """
+        if not self.isVisible():
+            return
+        versions = [buffer.version for output, _, target, _ in self._traces.values() for buffer in (output, target)]
+        if versions != self._paintedVersions:
+            self.update()
+
+    def render_background(self) -> QPixmap:
+        """
+        Cell frames and node names, only drawn again when the layout changed
+        """
+        ratio = self.devicePixelRatioF()
+        background = QPixmap(self.size() * ratio)
+        background.setDevicePixelRatio(ratio)
+        background.fill(_background_color)
+        painter = QPainter(background)
+        painter.setFont(self._labelFont)
+        painter.setPen(_text_color)
+        for index, node_id in enumerate(self._nodeIds):
+            rect = self.cell_rect(index)
+            painter.fillRect(rect, _cell_color)
+            painter.drawText(rect.adjusted(4, 1, -4, 0), Qt.AlignLeft | Qt.AlignTop, protocol_parser.node_label(node_id))
+        painter.end()
+        return background
+
+    def paintEvent(self, event):
+        stats_enabled = perf_stats.enabled
+        if stats_enabled:
+            paint_start = time.perf_counter()
+        ratio = self.devicePixelRatioF()
+        if self._background is None or self._background.size() != self.size() * ratio:
+            self._background = self.render_background()
+        exposed = event.rect()
+        painter = QPainter(self)
+        painter.drawPixmap(QRectF(exposed), self._background,
+                           QRectF(exposed.x() * ratio, exposed.y() * ratio, exposed.width() * ratio, exposed.height() * ratio))
+
+        self._paintedVersions = [buffer.version for output, _, target, _ in self._traces.values()
+                                 for buffer in (output, target)]
+        newest = max((output.timestamps[-1] for output, _, _, _ in self._traces.values() if len(output)), default=None)
+        if newest is None:
+            painter.end()
+            return
+        x_max = float(newest)
+        x_min = x_max - self.window_ms
+        spacing = self.cell_spacing
+        row_height = self.cell_height + spacing
+        cell_width = (self.width() + spacing) // self._columns - spacing
+        plot_width = cell_width - 4
+        plot_height = self.cell_height - self._header_height - 3
+        x_scale = plot_width / self.window_ms
+        # Cells of the rows in the exposed region only
+        first = max(0, exposed.top() // row_height) * self._columns
+        last = min(len(self._nodeIds), (exposed.bottom() // row_height + 1) * self._columns)
+        # Coordinates of the output and of the target traces of every cell, each kind drawn as one path
+        output_trace = ([], [])
+        target_trace = ([], [])
+        values = []
+        for index in range(first, last):
+            node_id = self._nodeIds[index]
+            output, output_detail, target, target_detail = self._traces[node_id]
+            row, column = divmod(index, self._columns)
+            left = column * (cell_width + spacing)
+            top = row * row_height
+            output_x, output_y = output_detail.view(x_min, x_max, plot_width)
+            if len(target):
+                # A target holds until the next one, so the last one is drawn up to the end of the window,
+                # unless the view already goes past it with the point it includes after the range
+                target_x, target_y = target_detail.view(x_min, x_max, plot_width)
+                if len(target_x) and target_x[-1] < x_max:
+                    target_x = np.append(target_x, x_max)
+                    target_y = np.append(target_y, target_y[-1])
+            else:
+                target_x = target_y = target.values
+            visible = [y for y in (output_y, target_y) if len(y) > 1]
+            if self._autoscale and visible:
+                y_min = min(float(y.min()) for y in visible)
+                y_max = max(float(y.max()) for y in visible)
+                # A flat trace is drawn across the middle of the cell
+                span = max(y_max - y_min, 1e-3 * (self._max_y_range - self._min_y_range), 1e-9)
+                y_min -= (span - (y_max - y_min)) / 2
+            else:
+                y_min, span = self._min_y_range, self._max_y_range - self._min_y_range
+            y_scale = plot_height / span
+            bottom = top + self._header_height + plot_height
+            for (xs, ys), x, y in ((output_trace, output_x, output_y), (target_trace, target_x, target_y)):
+                if len(x) > 1:
+                    xs.append(left + 2 + (x - x_min) * x_scale)
+                    ys.append(bottom - (np.clip(y, y_min, y_min + span) - y_min) * y_scale)
+            if len(output):
+                stale = output.timestamps[-1] < x_min
+                values.append((QRect(left + 4, top + 1, cell_width - 8, self._header_height),
+                               f"{output.values[-1]:.1f} {self._y_axis_unit}", stale))
+
+        painter.setClipRect(exposed)
+        for color, (xs, ys) in ((target_color, target_trace), (output_color, output_trace)):
+            painter.setPen(QPen(color, 0))
+            painter.drawPath(polyline_path(xs, ys))
+        painter.setFont(self._valueFont)
+        for stale in (False, True):
+            painter.setPen(_stale_color if stale else output_color)
+            for rect, text, value_stale in values:
+                if value_stale == stale:
+                    painter.drawText(rect, Qt.AlignRight | Qt.AlignTop, text)
+        painter.end()
+        if stats_enabled:
+            perf_stats.stats.record("dashboard_paint", time.perf_counter() - paint_start)
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self.update_layout()
+
+    def mouseDoubleClickEvent(self, event):
+        node_id = self.node_at(event.position().toPoint().x(), event.position().toPoint().y())
+        if node_id is not None:
+            self.nodeActivatedSignal.emit(node_id)
+
+
+class DashboardDialog(QDialog):
+    """
+    Window holding the sparkline grid of every node, with the time window and scaling controls.
+    Nodes are added with add_node as they are discovered.
+    """
+    def __init__(self, data_store: NodeDataStore, node_ids: list = (), min_y_range: float = 0.0,
+                 max_y_range: float = 100.0, y_axis_unit: str = "", parent=None):
+        super().__init__(parent)
+        self.setStyleSheet(style_sheet.graph_dialog_style_sheet)
+        self.setWindowTitle("Dashboard")
+        self.resize(1000, 700)
+
+        self._grid = SparklineGrid(data_store, min_y_range, max_y_range, y_axis_unit, self)
+        self.nodeActivatedSignal = self._grid.nodeActivatedSignal
+        for node_id in node_ids:
+            self._grid.add_node(node_id)
+
+        self._scrollArea = QScrollArea(self)
+        self._scrollArea.setWidgetResizable(True)
+        self._scrollArea.setWidget(self._grid)
+
+        self._windowCombobox = QComboBox(self)
+        self._windowCombobox.addItems(list(dashboard_windows))
+        self._windowCombobox.setCurrentText("1 min")
+        self._windowCombobox.currentTextChanged.connect(self.window_changed)
+
+        self._autoscaleCheckBox = QCheckBox("Autoscale", self)
+        self._autoscaleCheckBox.setChecked(True)
+        self._autoscaleCheckBox.toggled.connect(self._grid.set_autoscale)
+
+        self._outputLabel = QLabel("Output Pressure", self)
+        self._outputLabel.setStyleSheet(f"color: {output_color.name()};")
+        self._targetLabel = QLabel("Target Pressure", self)
+        self._targetLabel.setStyleSheet(f"color: {target_color.name()};")
+        self._hintLabel = QLabel("Double click a node to open its graph", self)
+
+        self._controlLayout = QHBoxLayout()
+        self._controlLayout.addWidget(self._outputLabel)
+        self._controlLayout.addWidget(self._targetLabel)
+        self._controlLayout.addStretch()
+        self._controlLayout.addWidget(self._hintLabel)
+        self._controlLayout.addWidget(self._autoscaleCheckBox)
+        self._controlLayout.addWidget(self._windowCombobox)
+
+        self.layout = QVBoxLayout(self)
+        self.layout.addWidget(self._scrollArea)
+        self.layout.addLayout(self._controlLayout)
+
+    @Slot(int)
+    def add_node(self, node_id: int) -> None:
+        self._grid.add_node(node_id)
+
+    @Slot(str)
+    def window_changed(self, window: str) -> None:
+        self._grid.set_window(dashboard_windows[window])
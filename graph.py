@@ -1,6 +1,6 @@
 from PySide6.QtWidgets import (QDialog, QApplication, QVBoxLayout,
                                QPushButton,QCheckBox,QGridLayout
-                               ,QSizePolicy,QGraphicsLineItem,QLabel)
+                               ,QSizePolicy,QGraphicsLineItem,QLabel,QComboBox,QProgressBar)
 
 from PySide6.QtCharts import (QChart, QLineSeries, QChartView,
                               QValueAxis, QDateTimeAxis)
@@ -9,9 +9,13 @@ from PySide6.QtGui import (QPainter, QPen, QColor,QFont,QLinearGradient)
 
 from PySide6.QtCore import (Qt, QDateTime, Slot,QTimer, 
                             Signal)
-import csv
+import time
 import style_sheet
-import datetime
+import perf_stats
+from sample_buffer import SampleBuffer, retention_policies
+from node_data_store import NodeSeries
+from csv_log_writer import CsvLogWriter
+from level_of_detail import LevelOfDetail
 
 class CustomChartView(QChartView):
     """
@@ -23,6 +27,9 @@ class CustomChartView(QChartView):
     OutputPressureCursorSignal = Signal(str,float)
     SupplyPressureCursorSignal = Signal(str,float)
 
+    # Display rate of the chart, incoming points are coalesced in between
+    refresh_rate_hz = 30
+
     def __init__(self,graph_name: str,
                  x_axis_label: str,
                  y_axis_label: str,
@@ -30,6 +37,9 @@ class CustomChartView(QChartView):
                  y_axis_unit: str = "",
                  min_y_range: float = 0.0,
                  max_y_range: float = 100.0,
+                 max_points: int = None,
+                 max_age_ms: float = None,
+                 data: NodeSeries = None,
                  parent=None):
         
         self._firstTimeInsertData = True
@@ -120,6 +130,31 @@ class CustomChartView(QChartView):
         self._targetPressureSeries = QLineSeries()
         self._targetPressureSeries.setName("Target Pressure")
 
+        """
+        Each series is backed by a SampleBuffer applying the retention policy of the chart,
+        and by a LevelOfDetail giving decimated views of it sized for the plot.
+        The buffers are those of a NodeSeries, given through data to display a node of the shared NodeDataStore.
+        New points are only appended to the buffers, and refresh_chart pushes the series whose buffer changed
+        to the chart at a fixed display rate, whatever the rate of incoming data.
+        """
+        if data is None:
+            data = NodeSeries()
+        self._data = data
+        self._supplyPressureData, self._outputPressureData, self._targetPressureData = data.buffers()
+        self._seriesData = [(self._supplyPressureLineSeries, self._supplyPressureData, LevelOfDetail(self._supplyPressureData),
+                             self.SupplyPressureCursorSignal, "supply"),
+                            (self._outputPressureSeries, self._outputPressureData, LevelOfDetail(self._outputPressureData),
+                             self.OutputPressureCursorSignal, "output"),
+                            (self._targetPressureSeries, self._targetPressureData, LevelOfDetail(self._targetPressureData),
+                             self.TargetPressureCursorSignal, "target")]
+        self._seriesBuffer = {series : buffer for series, buffer, _, _, _ in self._seriesData}
+        # Buffer version last pushed to each series, -1 forcing the first refresh
+        self._seriesVersion = {series : -1 for series in self._seriesBuffer}
+        self._dirtySeries = set()
+        # Timestamp (ms since epoch) of the newest sample pushed to the chart and not painted yet, for the performance statistics
+        self._unpaintedTimestamp = None
+        self.set_retention_policy(max_points, max_age_ms)
+
         """ 
         Add all series to the chart.
         This allows the chart to display multiple lines representing different data series.
@@ -191,21 +226,22 @@ class CustomChartView(QChartView):
 
         self.setRenderHints(QPainter.Antialiasing)
 
+        """
+        The x-axis follows the newest data until the user pans the chart, a double click resumes following.
+        """
+        self._followLive = True
+        self._refreshTimer = QTimer(self)
+        self._refreshTimer.timeout.connect(self.refresh_chart)
+        self._refreshTimer.start(1000 // self.refresh_rate_hz)
 
-    def find_closest_point(self, x , series: QLineSeries) -> int:
+
+    def find_closest_point(self, x , buffer: SampleBuffer) -> int:
         """
-        Find the closest point in the series to the given x-coordinate.
+        Find the closest point in the data of a series to the given x-coordinate.
         This is used to determine the position of the vertical line on mouse move.
+        The buffer keeps its timestamps sorted, so the lookup is a binary search instead of a scan of the series.
         """
-        closest_index = 0
-        min_distance = float('inf')
-        for i in range(series.count()):
-            point = series.at(i)
-            distance = abs(point.x() - x)
-            if distance < min_distance:
-                min_distance = distance
-                closest_index = i
-        return closest_index
+        return buffer.nearest_index(x)
     
     def wheelEvent(self, event):
         """
@@ -231,6 +267,7 @@ class CustomChartView(QChartView):
             new_duration = duration * 0.5
             self._x_axis.setMin(center.addMSecs(-int(new_duration // 2)))
             self._x_axis.setMax(center.addMSecs(int(new_duration // 2)))
+        self.redraw_all_series()
         super().wheelEvent(event)
     
     def mousePressEvent(self, event):
@@ -247,6 +284,7 @@ class CustomChartView(QChartView):
         if event.button() == Qt.LeftButton:
             self._chartPanning = True
             self._lastMousePos = event.position().toPoint()
+            self._followLive = False
 
         super().mousePressEvent(event)
 
@@ -262,17 +300,10 @@ class CustomChartView(QChartView):
                     self._vline.setLine(pos.x(), self.chart().plotArea().top(), pos.x(), self.chart().plotArea().bottom())
                     series_pos = self.chart().mapToValue(pos)
 
-                    if self._supplyPressureLineSeries.count() > 0:
-                        closest_point_supply_pressure = self.find_closest_point(series_pos.x(), self._supplyPressureLineSeries)
-                        self.SupplyPressureCursorSignal.emit("supply",self._supplyPressureLineSeries.at(closest_point_supply_pressure).y())
-
-                    if self._outputPressureSeries.count() > 0:
-                        closest_point_output_pressure = self.find_closest_point(series_pos.x(), self._outputPressureSeries)
-                        self.OutputPressureCursorSignal.emit("output",self._outputPressureSeries.at(closest_point_output_pressure).y())
-
-                    if self._targetPressureSeries.count() > 0:
-                        closest_point_target_pressure = self.find_closest_point(series_pos.x(), self._targetPressureSeries)
-                        self.TargetPressureCursorSignal.emit("target",self._targetPressureSeries.at(closest_point_target_pressure).y())
+                    for _, buffer, _, cursor_signal, name in self._seriesData:
+                        if len(buffer) > 0:
+                            closest_point = self.find_closest_point(series_pos.x(), buffer)
+                            cursor_signal.emit(name, float(buffer.values[closest_point]))
 
         """
         In case move event is used to pan the chart, the chart will scroll horizontally based on the mouse movement.
@@ -281,8 +312,17 @@ class CustomChartView(QChartView):
             delta = event.position().toPoint() - self._lastMousePos
             self._chartPressure.scroll(-delta.x(), 0)
             self._lastMousePos = event.position().toPoint()
+            self.redraw_all_series()
         super().mouseMoveEvent(event)
 
+    def mouseDoubleClickEvent(self, event):
+        """
+        Resume following the newest data after the chart has been panned
+        """
+        self._followLive = True
+        self.redraw_all_series()
+        super().mouseDoubleClickEvent(event)
+
     def mouseReleaseEvent(self, event):
         """
         Handle mouse release events to stop panning the chart.
@@ -293,19 +333,143 @@ class CustomChartView(QChartView):
             self._lastMousePos = None
         super().mouseReleaseEvent(event)
 
+    def set_retention_policy(self, max_points: int = None, max_age_ms: float = None) -> None:
+        """
+        Bound the data kept by the chart by number of points and/or age in ms, None meaning unbounded
+        """
+        for _, buffer, _, _, _ in self._seriesData:
+            buffer.set_retention(max_points, max_age_ms)
+
+    def add_pressure_data(self, series: QLineSeries, timestamp: QDateTime, value: float) -> None:
+        """
+        Append a new data point to the buffer of a series, it is displayed on the next chart refresh
+        """
+        self._seriesBuffer[series].append(timestamp.toMSecsSinceEpoch(), value)
+
+    def extend_pressure_data(self, timestamps, supply_pressure, target_pressure, output_pressure) -> None:
+        """
+        Append arrays of samples to the buffers in bulk, negative values meaning no update
+        """
+        self._data.extend(timestamps, supply_pressure, target_pressure, output_pressure)
+
+    def set_follow_live(self, enabled: bool) -> None:
+        self._followLive = enabled
+
+    def fit_to_data(self) -> None:
+        """
+        Show the whole retained history, e.g. once a log is loaded
+        """
+        buffers = [buffer for _, buffer, _, _, _ in self._seriesData if len(buffer)]
+        if not buffers:
+            return
+        oldest = QDateTime.fromMSecsSinceEpoch(int(min(buffer.timestamps[0] for buffer in buffers)))
+        newest = QDateTime.fromMSecsSinceEpoch(int(max(buffer.timestamps[-1] for buffer in buffers)))
+        self._x_axis.setRange(oldest, max(newest, oldest.addSecs(1)))
+        self._firstTimeInsertData = False
+        self.redraw_all_series()
+
+    def reset_view(self) -> None:
+        """
+        Place the x-axis again on the next data received and resume following it, e.g. after the buffers were cleared
+        """
+        self._firstTimeInsertData = True
+        self._followLive = True
+        self.redraw_all_series()
+
+    def follow_newest_data(self) -> None:
+        """
+        Place the x-axis on the first data received, then keep the newest data in view while live following is on.
+        Every series has to be redrawn when the displayed range moves.
+        """
+        buffers = [buffer for _, buffer, _, _, _ in self._seriesData if len(buffer)]
+        if not buffers:
+            return
+        newest = QDateTime.fromMSecsSinceEpoch(int(max(buffer.timestamps[-1] for buffer in buffers)))
+        if self._firstTimeInsertData:
+            oldest = QDateTime.fromMSecsSinceEpoch(int(min(buffer.timestamps[0] for buffer in buffers)))
+            self._x_axis.setMin(oldest)
+            self._x_axis.setMax(oldest.addSecs(30))
+            self._firstTimeInsertData = False
+        elif self._followLive and newest > self._x_axis.max():
+            duration = self._x_axis.min().msecsTo(self._x_axis.max())
+            self._x_axis.setRange(newest.addMSecs(-duration), newest)
+        else:
+            return
+        self.redraw_all_series()
+
+    @Slot()
+    def refresh_chart(self) -> None:
+        """
+        Push every point added since the last refresh to the chart, at most refresh_rate_hz times per second.
+        A series is modified when the version of its buffer changed or when the displayed range moved.
+        Each modified series is updated with one bulk replace of the level of detail view matching
+        the displayed x range and the plot width, so the number of drawn points stays bounded
+        by the plot width however long the session is.
+        Unless the cursor is enabled, the labels are updated with the newest values.
+        The chart is not touched while hidden, new points are pushed when it is shown again.
+        """
+        if not self.isVisible():
+            return
+        for series, buffer in self._seriesBuffer.items():
+            if buffer.version != self._seriesVersion[series]:
+                self._dirtySeries.add(series)
+        if not self._dirtySeries:
+            return
+        stats_enabled = perf_stats.enabled
+        if stats_enabled:
+            refresh_start = time.perf_counter()
+        self.follow_newest_data()
+        x_min = self._x_axis.min().toMSecsSinceEpoch()
+        x_max = self._x_axis.max().toMSecsSinceEpoch()
+        max_points = 2 * max(1, int(self._chartPressure.plotArea().width()))
+        for series, buffer, level_of_detail, cursor_signal, name in self._seriesData:
+            if series not in self._dirtySeries:
+                continue
+            series.replaceNp(*level_of_detail.view(x_min, x_max, max_points))
+            self._seriesVersion[series] = buffer.version
+            if len(buffer) and not self._cursorEnabled:
+                cursor_signal.emit(name, float(buffer.values[-1]))
+        self._dirtySeries.clear()
+        if stats_enabled:
+            perf_stats.stats.record("chart_refresh", time.perf_counter() - refresh_start)
+            newest = [buffer.timestamps[-1] for buffer in self._seriesBuffer.values() if len(buffer)]
+            if newest:
+                self._unpaintedTimestamp = float(max(newest))
+
+    def paintEvent(self, event):
+        """
+        Measure painting and the latency from the reception of the newest sample to the end of its paint
+        Replayed and loaded data carry recorded timestamps, so latencies above a minute are ignored
+        """
+        if not perf_stats.enabled:
+            super().paintEvent(event)
+            return
+        paint_start = time.perf_counter()
+        super().paintEvent(event)
+        perf_stats.stats.record("chart_paint", time.perf_counter() - paint_start)
+        if self._unpaintedTimestamp is not None:
+            latency = (QDateTime.currentMSecsSinceEpoch() - self._unpaintedTimestamp) / 1000
+            if 0.0 <= latency < 60.0:
+                perf_stats.stats.record("receive_to_screen", latency)
+            self._unpaintedTimestamp = None
+
+    def redraw_all_series(self) -> None:
+        """
+        Request a new level of detail view of every series on the next refresh, after the displayed range or size changed
+        """
+        self._dirtySeries.update(self._seriesBuffer)
+
+    def resizeEvent(self, event):
+        self.redraw_all_series()
+        super().resizeEvent(event)
+
     @Slot(QDateTime, float)
     def add_supply_pressure_data(self, timestamp: QDateTime, value: float):
         """
         Add a new data point to the supply pressure series.
         This is also a slot that can be connected to a signal to update the series with new data.
         """
-        if self._firstTimeInsertData:
-            self._x_axis.setMin(timestamp)
-            self._x_axis.setMax(timestamp.addSecs(30))
-            self._firstTimeInsertData = False
-        self._supplyPressureLineSeries.append(timestamp.toMSecsSinceEpoch(), value)
-        if not self._cursorEnabled:
-            self.SupplyPressureCursorSignal.emit("supply",value)
+        self.add_pressure_data(self._supplyPressureLineSeries, timestamp, value)
 
     @Slot(QDateTime, float) 
     def add_output_pressure_data(self, timestamp: QDateTime, value: float):
@@ -313,13 +477,7 @@ class CustomChartView(QChartView):
         Add a new data point to the output pressure series.
         This is also a slot that can be connected to a signal to update the series with new data.
         """
-        if self._firstTimeInsertData:
-            self._x_axis.setMin(timestamp)
-            self._x_axis.setMax(timestamp.addSecs(30))
-            self._firstTimeInsertData = False
-        self._outputPressureSeries.append(timestamp.toMSecsSinceEpoch(), value)
-        if not self._cursorEnabled:
-            self.OutputPressureCursorSignal.emit("output",value)
+        self.add_pressure_data(self._outputPressureSeries, timestamp, value)
 
     @Slot(QDateTime, float)
     def add_target_pressure_data(self, timestamp: QDateTime, value: float):
@@ -327,13 +485,7 @@ class CustomChartView(QChartView):
         Add a new data point to the target pressure series.
         This is also a slot that can be connected to a signal to update the series with new data.
         """
-        if self._firstTimeInsertData:
-            self._x_axis.setMin(timestamp)
-            self._x_axis.setMax(timestamp.addSecs(30))
-            self._firstTimeInsertData = False
-        self._targetPressureSeries.append(timestamp.toMSecsSinceEpoch(), value)
-        if not self._cursorEnabled:
-            self.TargetPressureCursorSignal.emit("target",value)
+        self.add_pressure_data(self._targetPressureSeries, timestamp, value)
 
     @Slot(bool)
     def set_cursor_enabled(self, enabled: bool):
@@ -374,12 +526,16 @@ class GraphDialog(QDialog):
                  y_axis_unit: str = "",
                  min_y_range: float = 0.0,
                  max_y_range: float = 100.0,
+                 retention: str = "Keep all",
+                 data: NodeSeries = None,
+                 log_writer: CsvLogWriter = None,
                  parent = None):
         
         super().__init__(parent)
-        self._node_available = False
         self.setStyleSheet(style_sheet.graph_dialog_style_sheet)
-        self._logdata = list()
+        # Dialogs without a shared writer create their own on first save, and close it with the dialog
+        self._logWriter = log_writer
+        self._ownLogWriter = False
         self._logSaving = False
         self._chartFreeze = False
 
@@ -397,7 +553,8 @@ class GraphDialog(QDialog):
         Create a chart view to display the chart.
         The chart view is responsible for rendering the chart and its series.
         """
-        self._chartView = CustomChartView(graph_name,x_axis_label, y_axis_label, x_axis_unit, y_axis_unit, min_y_range, max_y_range,self);
+        self._chartView = CustomChartView(graph_name,x_axis_label, y_axis_label, x_axis_unit, y_axis_unit, min_y_range, max_y_range,
+                                          *retention_policies[retention], data, parent=self)
         self._chartView.TargetPressureCursorSignal.connect(self.display_pressure_data)
         self._chartView.OutputPressureCursorSignal.connect(self.display_pressure_data)
         self._chartView.SupplyPressureCursorSignal.connect(self.display_pressure_data)
@@ -423,6 +580,12 @@ class GraphDialog(QDialog):
         self._cursorCheckBox.setChecked(False)
         self._cursorCheckBox.stateChanged.connect(self._chartView.set_cursor_enabled)
 
+        # Add a combobox to select how much history the chart keeps
+        self._retentionCombobox = QComboBox(self)
+        self._retentionCombobox.addItems(list(retention_policies))
+        self._retentionCombobox.setCurrentText(retention)
+        self._retentionCombobox.currentTextChanged.connect(self.retention_changed)
+
         self._outputPressureLabel = QLabel("Output Pressure: ",self)
         self._outputPressureLabel.setText("Output Pressure: n/a mbar")
         self._targetPressureLabel = QLabel("Target Pressure: ",self)
@@ -440,6 +603,13 @@ class GraphDialog(QDialog):
         self._controlLayout.addWidget(self._samplingCheckBox, 1, 0, 1, 2)
         self._controlLayout.addWidget(self._cursorCheckBox, 1, 2, 1, 2)
         self._controlLayout.addWidget(self._logSavingButton, 1, 4, 1, 2)
+        self._controlLayout.addWidget(self._retentionCombobox, 1, 6, 1, 2)
+
+        # Progress of the setpoint profile running on this node, only shown while one runs
+        self._profileProgressBar = QProgressBar(self)
+        self._profileProgressBar.setRange(0, 1000)
+        self._profileProgressBar.hide()
+        self._controlLayout.addWidget(self._profileProgressBar, 2, 0, 1, 8)
         self.layout.addLayout(self._controlLayout)
 
         self.setLayout(self.layout)
@@ -447,11 +617,15 @@ class GraphDialog(QDialog):
     def closeEvent(self, event):
         """
         Action needed before closing
-        Saving logging data still in the buffer to the file
+        Pushing logging data still queued to the file
         Notifying GraphManager about its closure
         """
-        if self._logSaving:
-            self.save_logging_data()
+        if self._ownLogWriter:
+            self._logWriter.close()
+            self._logWriter = None
+            self._ownLogWriter = False
+        elif self._logSaving:
+            self._logWriter.flush()
         self.onGraphDialogCloseSignal.emit(self._graph_id)
         super().closeEvent(event)
     
@@ -460,12 +634,23 @@ class GraphDialog(QDialog):
 
         """
         Slot to turn on/off saving log feature
+        All the data saved during a session goes to the same file, whatever the number of times saving is toggled
         """
+        if self._logWriter is None:
+            self._logWriter = CsvLogWriter()
+            self._ownLogWriter = True
         self._logSaving = not self._logSaving
         self._logSavingButton.setText("Saving..." if self._logSaving else "Save")
 
-        if self._logSaving is False and len(self._logdata):
-            self.save_logging_data()
+        if self._logSaving is False:
+            self._logWriter.flush()
+
+    @Slot(str)
+    def retention_changed(self, retention: str) -> None:
+        """
+        Slot to apply the retention policy selected in the retention combobox
+        """
+        self._chartView.set_retention_policy(*retention_policies[retention])
 
     @Slot(str,float)
     def display_pressure_data(self,name:str, value: float) -> None:
@@ -473,11 +658,11 @@ class GraphDialog(QDialog):
         Slot to display supply pressure data on the chart in which the cursor is currently positioned.
         """
         if name == "supply":
-            self._supplyPressureLabel.setText(f"Supply Pressure: {format(value,".2f")} mbar")
+            self._supplyPressureLabel.setText(f"Supply Pressure: {format(value,'.2f')} mbar")
         elif name == "output":
-            self._outputPressureLabel.setText(f"Output Pressure: {format(value,".2f")} mbar")
+            self._outputPressureLabel.setText(f"Output Pressure: {format(value,'.2f')} mbar")
         elif name == "target":
-            self._targetPressureLabel.setText(f"Target Pressure: {format(value,".2f")} mbar")
+            self._targetPressureLabel.setText(f"Target Pressure: {format(value,'.2f')} mbar")
 
     @Slot(QDateTime,float,float,float)
     def pressure_update(self,id_: int, now: QDateTime,
@@ -485,36 +670,54 @@ class GraphDialog(QDialog):
                         target_pressure : float, 
                         output_pressure : float ) -> None:
         """
-        This slot is used to update pressure data in official version
-        It shall be connected to graph_manager.py which shall feed the real time data for each node corresponding to its graph diaglog
-        If saving is enabled, it shall automatically save to a file after 1000 samples to reduce number of time we have to open/close 
-        the file for saving workload purpose
+        This slot is used to add pressure data to a graph which owns its data, e.g. when displaying a log
+        Graphs of live nodes display the data of GraphManager's NodeDataStore, which is fed by the manager itself
         If pressure value is less than 0 then this value has no update
         """
         if self._graph_id != id_:
             return
-        if supply_pressure >= 0.0 and self._node_available:
+        if supply_pressure >= 0.0:
             self._chartView.add_supply_pressure_data(now, supply_pressure)
         if output_pressure >= 0.0:
             self._chartView.add_output_pressure_data(now, output_pressure)
-            self._node_available = True
-        if target_pressure >= 0.0 and self._node_available:
+        if target_pressure >= 0.0:
             self._chartView.add_target_pressure_data(now, target_pressure)
-        
+        self.log_pressure_data(now,supply_pressure,target_pressure,output_pressure)
+
+    def load_pressure_data(self, timestamps, supply_pressure, output_pressure, target_pressure) -> None:
+        """
+        Slot receiving a parsed chunk of a log, appended to the chart in bulk
+        The chart stays on the loaded range instead of following the newest data
+        """
+        self._chartView.set_follow_live(False)
+        self._chartView.extend_pressure_data(timestamps, supply_pressure, target_pressure, output_pressure)
+
+    def reset_view(self) -> None:
+        self._chartView.reset_view()
+
+    def set_profile_progress(self, name: str, elapsed_s: float, duration_s: float) -> None:
+        """
+        Show the progress of the setpoint profile of this node, hidden again by clear_profile_progress
+        """
+        elapsed_s = min(elapsed_s, duration_s)
+        self._profileProgressBar.setValue(int(1000 * elapsed_s / duration_s) if duration_s > 0 else 1000)
+        self._profileProgressBar.setFormat(f"{name}: {elapsed_s:.1f} / {duration_s:.1f} s")
+        self._profileProgressBar.show()
 
+    def clear_profile_progress(self) -> None:
+        self._profileProgressBar.hide()
+
+    def show_all_data(self) -> None:
+        self._chartView.fit_to_data()
+
+    def log_pressure_data(self, now: QDateTime,
+                          supply_pressure : float,
+                          target_pressure : float,
+                          output_pressure : float) -> None:
+        """
+        If saving is enabled, the data is queued to the background CSV writer,
+        which appends it to the file of this graph for the current session
+        """
         if self._logSaving:
-            self._logdata.append([now.toString(),
-                        str(format(supply_pressure,".2f")),
-                        str(format(output_pressure,".2f")),
-                        str(format(target_pressure,".2f"))])
-            if len(self._logdata) >= 1000:
-                self.save_logging_data()
-
-    def save_logging_data(self) -> None:
-        try:
-            with open(f"{QDateTime.currentDateTime().toString("yyyy-MM-dd_HH-mm-ss")}_{self.graph_name}.csv",'a') as csvfile:
-                csv_writer = csv.writer(csvfile)
-                csv_writer.writerows(self._logdata)
-            self._logdata.clear()
-        except Exception as e:
-            print(e)
+            self._logWriter.write(self.graph_name,now.toMSecsSinceEpoch(),
+                                  supply_pressure,output_pressure,target_pressure)
@@ -1,14 +1,34 @@
 from PySide6.QtCore import (Qt, QDateTime, Slot,
                             QTimer, Signal,QObject)
-from graph import *
+import time
+import perf_stats
+import protocol_parser
+from sample_buffer import retention_policies
+from node_data_store import NodeDataStore
+from csv_log_writer import CsvLogWriter
 
 class GraphManager(QObject):
-    updatePressureDataBasedOnIDSignal = Signal(int,QDateTime,float,float,float)
+    # Emitted with the global id of a node the first time it reports its output pressure
+    nodeDiscoveredSignal = Signal(int)
     def __init__(self , parent = None):
         super().__init__(parent)
-    
+        # Retention policy of the live graphs, so long sessions keep a bounded history
+        self._retention = "Keep 1 h"
+        # Single copy of the pressure history of every node, shared by graphs, logging and analysis
+        self._dataStore = NodeDataStore(*retention_policies[self._retention])
+        # Background CSV writer shared by all graphs, started when the first graph is built
+        self._logWriter = None
+        # Setpoint profile running and its elapsed time, shown by the graphs of its nodes
+        self._profile = None
+        self._profileElapsed = 0.0
+        # Sparkline grid of every node, built the first time it is shown
+        self._dashboard = None
+
+    def dataStore(self) -> NodeDataStore:
+        return self._dataStore
+
     def initializeInternalVar(self,available_node : list[int] , pressure_unit: str, min_pressure: float , max_pressure: float) -> None:
-        self._available_node = available_node
+        self._available_node = list(available_node)
         self._pressure_unit = pressure_unit
         self._min_pressure = min_pressure
         self._max_pressure = max_pressure
@@ -16,43 +36,173 @@ class GraphManager(QObject):
 
     def intializeGraphDialog(self) -> None:
         """
-        This function initializes all the graph dialog which are managed by GraphManager
-        It connects signal updatePressureDataBasedOnIDSignal to all its child graph dialog
-        All of the graph also connect onGraphDialogCloseSignal to onGraphDiaglogClose to inform GraphManager about its closure
-        """
-        self._available_graph = [GraphDialog(f"Pressure Monitoring Node {i}",i,
-                                             "Time",
-                                             "Pressure",
-                                             self._pressure_unit,"s",
-                                             self._min_pressure,
-                                             self._max_pressure) for i in self._available_node]
-        
+        This function initializes the bookkeeping of the graph dialogs managed by GraphManager
+        Samples of every node go to the NodeDataStore, graph dialogs display the data of their node from there
+        and are only built the first time they are shown, so no history is lost for nodes never displayed
+        The graphs are kept in a routing table keyed on node id, so logging goes straight to its graph
+        Nodes which are not given here are discovered when they first report their output pressure,
+        so nothing is allocated for node ids which never show up
+        """
+        self._available_graph = {}
+        for i in self._available_node:
+            self._dataStore.add_node(i)
+        # Nodes which already reported their output pressure, the only ones interested in supply and target pressure,
+        # kept per port slot as supply pressure is reported by each controller for its own nodes
+        self._active_node = {}
         self._show_status = {i : False for i in self._available_node}
-        for graph in self._available_graph:
-            self.updatePressureDataBasedOnIDSignal.connect(graph.pressure_update)
-            graph.onGraphDialogCloseSignal.connect(self.onGraphDiaglogClose)
         ...
 
+    def createGraphDialog(self, id : int):
+        """
+        Build the graph dialog of a node on top of its history in the data store
+        All of the graph connect onGraphDialogCloseSignal to onGraphDiaglogClose to inform GraphManager about its closure
+        Qt Charts is only imported at this point to keep the application startup fast
+        """
+        from graph import GraphDialog
+        if self._logWriter is None:
+            self._logWriter = CsvLogWriter()
+        graph = GraphDialog(f"Pressure Monitoring {protocol_parser.node_label(id)}",id,
+                            "Time",
+                            "Pressure",
+                            self._pressure_unit,"s",
+                            self._min_pressure,
+                            self._max_pressure,
+                            self._retention,
+                            self._dataStore.node(id),
+                            self._logWriter)
+        graph.onGraphDialogCloseSignal.connect(self.onGraphDiaglogClose)
+        self._available_graph[id] = graph
+        if self._profile is not None and id in self._profile.node_durations:
+            graph.set_profile_progress(self._profile.name, self._profileElapsed, self._profile.node_durations[id])
+        return graph
+
+    def showDashboard(self) -> None:
+        """
+        Show every node in one window, built on first use on top of the data store like the graphs
+        Nodes discovered later are added to it, double clicking one of them shows its graph
+        Its painting is only imported at this point to keep the application startup fast
+        """
+        if self._dashboard is None:
+            from dashboard import DashboardDialog
+            self._dashboard = DashboardDialog(self._dataStore, self.nodeIds(),
+                                              self._min_pressure, self._max_pressure, self._pressure_unit)
+            self.nodeDiscoveredSignal.connect(self._dashboard.add_node)
+            self._dashboard.nodeActivatedSignal.connect(self.showGraphBasedOnID)
+        self._dashboard.show()
+        self._dashboard.raise_()
+
     def pressureInformationUpdate(self,id_ : int, now : QDateTime, supply_pressure : float, target_pressure : float, output_pressure : float) -> None:
         """
-        Forward pressure data to corresponding graph based on graph id
+        Store pressure data of a node and forward it to the corresponding graph, based on graph id, for logging
+        Supply and target pressure are ignored until the node has reported its output pressure,
+        which registers the node if it is new
         """
-        self.updatePressureDataBasedOnIDSignal.emit(id_,now,supply_pressure,target_pressure,output_pressure)
-        ...
-    
+        active_node = self._active_node.get(id_ // protocol_parser.nodes_per_port)
+        if active_node is None or id_ not in active_node:
+            if output_pressure < 0.0:
+                return
+            self.activateNode(id_)
+        if perf_stats.enabled:
+            store_start = time.perf_counter()
+            self._dataStore.append(id_,now.toMSecsSinceEpoch(),supply_pressure,target_pressure,output_pressure)
+            perf_stats.stats.record("store", time.perf_counter() - store_start)
+        else:
+            self._dataStore.append(id_,now.toMSecsSinceEpoch(),supply_pressure,target_pressure,output_pressure)
+        graph = self._available_graph.get(id_)
+        if graph is not None:
+            graph.log_pressure_data(now,supply_pressure,target_pressure,output_pressure)
+
+    def supplyPressureUpdate(self, now : QDateTime, supply_pressure : float, port_slot : int = 0) -> None:
+        """
+        Store one supply pressure reading, which is shared by all nodes of a controller, for every active node of its port in one call
+        """
+        active_node = self._active_node.get(port_slot)
+        if not active_node:
+            return
+        if perf_stats.enabled:
+            store_start = time.perf_counter()
+            self._dataStore.append_supply(active_node,now.toMSecsSinceEpoch(),supply_pressure)
+            perf_stats.stats.record("store", time.perf_counter() - store_start)
+        else:
+            self._dataStore.append_supply(active_node,now.toMSecsSinceEpoch(),supply_pressure)
+        # Only the graphs built so far can log, usually far fewer than the active nodes
+        for id_, graph in self._available_graph.items():
+            if id_ in active_node:
+                graph.log_pressure_data(now,supply_pressure,-1.0,-1.0)
+
+    def activateNode(self, id_ : int) -> None:
+        """
+        Mark a node as active, allocating its history and announcing it if it was unknown so far
+        """
+        self._active_node.setdefault(id_ // protocol_parser.nodes_per_port, set()).add(id_)
+        if id_ not in self._dataStore:
+            self._dataStore.add_node(id_)
+            self._available_node.append(id_)
+            self._show_status[id_] = False
+            self.nodeDiscoveredSignal.emit(id_)
+
+    def nodeIds(self) -> list[int]:
+        return sorted(self._available_node)
+
+    def clearData(self) -> None:
+        """
+        Forget the pressure history of every node, e.g. before replaying a session from another point in time
+        Graphs place their time axis again on the next data received
+        """
+        self._dataStore.clear()
+        for graph in self._available_graph.values():
+            graph.reset_view()
+
+    def startProfile(self, profile) -> None:
+        """
+        Display the progress of a setpoint profile in the graphs of its nodes, including the graphs built later on
+        """
+        self._profile = profile
+        self.profileProgressUpdate(0.0)
+
+    def profileProgressUpdate(self, elapsed_s: float) -> None:
+        if self._profile is None:
+            return
+        self._profileElapsed = elapsed_s
+        for id_, duration_s in self._profile.node_durations.items():
+            graph = self._available_graph.get(id_)
+            if graph is not None:
+                graph.set_profile_progress(self._profile.name, elapsed_s, duration_s)
+
+    def stopProfile(self) -> None:
+        if self._profile is None:
+            return
+        for id_ in self._profile.node_durations:
+            graph = self._available_graph.get(id_)
+            if graph is not None:
+                graph.clear_profile_progress()
+        self._profile = None
+
     def showGraphBasedOnID(self,id : int) -> None:
         """
-        Finding available graph based on id.
+        Finding available graph based on id, building it on first use.
         If the graph is already being shown, it shall stop displaying another one.
         """
-        for graph in self._available_graph:
-            if graph._graph_id == id and not self._show_status[id]:
-                graph.show()
-                self._show_status[id] = True
-    
+        if id not in self._dataStore or self._show_status[id]:
+            return
+        graph = self._available_graph.get(id)
+        if graph is None:
+            graph = self.createGraphDialog(id)
+        graph.show()
+        self._show_status[id] = True
+
     def onGraphDiaglogClose(self,id : int):
         """
         Update showing status of a graph based on graph id
         """
         self._show_status[id] = False
 
+    def shutdown(self) -> None:
+        """
+        Write every queued log row to disk before the application exits
+        """
+        if self._dashboard is not None:
+            self._dashboard.close()
+        if self._logWriter is not None:
+            self._logWriter.close()
+            self._logWriter = None
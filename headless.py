@@ -0,0 +1,280 @@
+"""
+Headless acquisition and logging, for unattended runs without charts.
+
+It only needs pyserial and NumPy: no Qt module is imported and no widget is built. Every port is read by
+its own thread at full link rate, frames are decoded in bulk and logged through the same CSV writer as the
+application, into the same files a graph would write ("<session start>_Pressure Monitoring Node N.csv"),
+so the logs open and replay in the application. A throughput line is printed periodically.
+
+    python headless.py --port /dev/ttyUSB0 --port /dev/ttyUSB1 --nodes 1-8 --output logs --capture
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+import protocol_parser
+import perf_stats
+from csv_log_writer import CsvLogWriter, default_flush_interval_s
+from stoppable_thread import StoppableThreadMixin
+
+default_baud_rate = 115200
+default_stats_interval_s = 10.0
+default_reconnect_interval_s = 5.0
+# Shortest time between two reads of a port. Nothing is displayed, so frames are left to accumulate in the
+# OS buffer and the fixed cost of a read and a bulk decode is shared by more frames. Frames of a read share
+# its receive timestamp, so this is also the time resolution of the logs.
+default_read_interval_s = 0.01
+# Headers of the frames logged: node pressure frames and the supply pressure frame
+_node_headers = (0x10, 0x03)
+_supply_header = 0x09
+
+
+def log_name(global_id: int) -> str:
+    """
+    Log name of a node, the one of its graph in the application
+    """
+    return f"Pressure Monitoring {protocol_parser.node_label(global_id)}"
+
+
+class PortAcquisition(StoppableThreadMixin, threading.Thread):
+    """
+    Acquisition thread of one port.
+    Like SerialReader, every loop drains what the OS buffered with one read, splits it into frames and
+    decodes them, here with protocol_parser.decode_frames so there is no decoding work per frame.
+    Reads are at least read_interval_s apart, so every read handles a large batch.
+    Node pressure frames log the output pressure of their node, supply pressure frames log the supply
+    pressure of every node of the port which reported its output pressure already, as GraphManager does.
+    When the port fails it is opened again every reconnect_interval_s, unless that is 0.
+    A capture which can not be written anymore is dropped, logging goes on.
+    """
+    def __init__(self, port_name: str, port_slot: int, log_writer: CsvLogWriter,
+                 baud_rate: int = default_baud_rate, node_ids: list = None, capture_writer=None,
+                 reconnect_interval_s: float = default_reconnect_interval_s,
+                 read_interval_s: float = default_read_interval_s):
+        super().__init__(name=f"acquisition-{port_name}", daemon=True)
+        self.port_name = port_name
+        self.port_slot = port_slot
+        self._logWriter = log_writer
+        self._baudRate = baud_rate
+        # Node ids on the controller to log, None for all
+        self._nodeIds = set(node_ids) if node_ids is not None else None
+        self._captureWriter = capture_writer
+        self._reconnectInterval = reconnect_interval_s
+        self._readInterval = read_interval_s
+        self._decoder = protocol_parser.FrameDecoder()
+        self._droppedReported = 0
+        # Log name of every node which reported its output pressure, in order of appearance
+        self._logNames = {}
+        self._activeNodes = []
+        self._running = False
+        self.error = None
+
+    def open(self):
+        import serial
+        return serial.Serial(self.port_name, self._baudRate, timeout=0.1)
+
+    def run(self) -> None:
+        serial_port = None
+        while self._running:
+            if serial_port is None:
+                try:
+                    serial_port = self.open()
+                    self._decoder.reset()
+                    self.error = None
+                except Exception as e:
+                    if not self.report_error(e):
+                        break
+                    continue
+            try:
+                chunk = serial_port.read(max(serial_port.in_waiting, protocol_parser.default_frame_length))
+            except Exception as e:
+                serial_port.close()
+                serial_port = None
+                if not self.report_error(e):
+                    break
+                continue
+            if chunk:
+                self.handle_chunk(chunk)
+                time.sleep(self._readInterval)
+        if serial_port is not None:
+            serial_port.close()
+        self._running = False
+
+    def report_error(self, error: Exception) -> bool:
+        """
+        Print a port error and wait before opening it again, False when the thread should stop instead
+        """
+        self.error = str(error)
+        print(f"{datetime.now().isoformat(timespec='seconds')} {self.port_name}: {error}", flush=True)
+        if self._reconnectInterval <= 0:
+            return False
+        deadline = time.monotonic() + self._reconnectInterval
+        while self._running and time.monotonic() < deadline:
+            time.sleep(0.1)
+        return self._running
+
+    def handle_chunk(self, chunk: bytes) -> None:
+        decode_start = time.perf_counter()
+        capture_writer = self._captureWriter
+        if capture_writer is not None:
+            receive_ns = capture_writer.now_ns()
+            timestamp_ms = receive_ns / 1e6
+        else:
+            timestamp_ms = time.time() * 1000
+        frames = self._decoder.feed(chunk)
+        stats = perf_stats.stats
+        stats.count("bytes_read", len(chunk))
+        stats.count("bytes_dropped", self._decoder.dropped_bytes - self._droppedReported)
+        self._droppedReported = self._decoder.dropped_bytes
+        if frames:
+            records = protocol_parser.decode_frames(b"".join(frames))
+            stats.count("frames_received", len(frames))
+            stats.record("decode", time.perf_counter() - decode_start)
+        if capture_writer is not None:
+            try:
+                capture_writer.write(frames, receive_ns)
+            except OSError as e:
+                # Logging goes on without the capture
+                self._captureWriter = None
+                print(f"{datetime.now().isoformat(timespec='seconds')} {self.port_name}: capture stopped: {e}", flush=True)
+        if not frames:
+            return
+        stats.count("rows_logged", self.log_records(records['frame_type'].tolist(), records['node_id'].tolist(),
+                                                    records['value'].tolist(), timestamp_ms))
+
+    def log_records(self, frame_types: list, node_ids: list, values: list, timestamp_ms: float) -> int:
+        """
+        Queue the log rows of decoded frames, returns the number of rows
+        """
+        write = self._logWriter.write
+        node_filter = self._nodeIds
+        log_names = self._logNames
+        active_nodes = self._activeNodes
+        rows = 0
+        for frame_type, node_id, value in zip(frame_types, node_ids, values):
+            if frame_type in _node_headers:
+                if node_filter is not None and node_id not in node_filter:
+                    continue
+                name = log_names.get(node_id)
+                if name is None:
+                    name = log_names[node_id] = log_name(protocol_parser.global_node_id(self.port_slot, node_id))
+                    active_nodes.append(name)
+                write(name, timestamp_ms, -1.0, value, -1.0)
+                rows += 1
+            elif frame_type == _supply_header:
+                for name in active_nodes:
+                    write(name, timestamp_ms, value, -1.0, -1.0)
+                rows += len(active_nodes)
+        return rows
+
+    def stop(self) -> None:
+        """
+        Ask the loop to finish and wait for the thread, at the latest one port read timeout later
+        """
+        self._running = False
+        self.join()
+
+
+def process_usage() -> tuple[float, float]:
+    """
+    CPU time of the process in s and its peak resident memory in MB, 0 where the platform does not tell
+    """
+    try:
+        import resource
+    except ImportError:
+        return time.process_time(), 0.0
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kB on Linux and in bytes on macOS
+    return time.process_time(), peak_rss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def format_stats(elapsed_s: float, cpu_percent: float, peak_rss_mb: float) -> str:
+    stats = perf_stats.stats
+    counters = stats.counters
+    rates = stats.rates
+    return (f"{datetime.now().isoformat(timespec='seconds')} [{elapsed_s:8.0f} s] "
+            f"{counters.get('frames_received', 0)} frames ({rates.get('frames_received', 0.0):.0f}/s), "
+            f"{rates.get('bytes_read', 0.0):.0f} B/s, {counters.get('bytes_dropped', 0)} bytes dropped, "
+            f"{counters.get('rows_logged', 0)} rows logged ({rates.get('rows_logged', 0.0):.0f}/s), "
+            f"CPU {cpu_percent:.1f} %, peak RSS {peak_rss_mb:.0f} MB")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Headless acquisition and CSV logging without the GUI")
+    parser.add_argument("--port", action="append", required=True,
+                        help="serial port, repeat for several controllers (nodes of port N are logged as \"Port N Node M\")")
+    parser.add_argument("--baud", type=int, default=default_baud_rate, help="baud rate")
+    parser.add_argument("--nodes", default=None, help="nodes to log on every port, e.g. 1-8 or 1,3,5 (default: all)")
+    parser.add_argument("--output", default=".", help="directory of the CSV logs and captures")
+    parser.add_argument("--flush-interval", type=float, default=default_flush_interval_s,
+                        help="longest time a logged row stays buffered, in s")
+    parser.add_argument("--fsync", action="store_true", help="also fsync the logs on every flush")
+    parser.add_argument("--capture", action="store_true", help="also record a raw capture of every port")
+    parser.add_argument("--stats-interval", type=float, default=default_stats_interval_s,
+                        help="print throughput statistics every this many s, 0 to disable")
+    parser.add_argument("--stats-dump", default=None, help="also append the statistics to this file as JSON lines")
+    parser.add_argument("--reconnect-interval", type=float, default=default_reconnect_interval_s,
+                        help="open a failed port again after this many s, 0 to stop on the first error")
+    parser.add_argument("--read-interval", type=float, default=default_read_interval_s,
+                        help="shortest time between two reads of a port in s, also the time resolution of the logs")
+    parser.add_argument("--duration", type=float, default=None, help="stop after this many s")
+    args = parser.parse_args()
+
+    node_ids = protocol_parser.parse_node_ids(args.nodes) if args.nodes else None
+    os.makedirs(args.output, exist_ok=True)
+    log_writer = CsvLogWriter(args.output, args.flush_interval, args.fsync, on_error=lambda path, error: print(
+        f"{datetime.now().isoformat(timespec='seconds')} {path}: {error}", flush=True))
+    capture_writers = []
+    acquisitions = []
+    perf_stats.set_enabled(True)
+    try:
+        for port_slot, port_name in enumerate(args.port):
+            capture_writer = None
+            if args.capture:
+                import capture
+                capture_writer = capture.CaptureWriter(
+                    log_writer.path_for(f"capture_port{port_slot + 1}")[:-len(".csv")] + capture.capture_extension,
+                    port_slot=port_slot)
+                capture_writers.append(capture_writer)
+            acquisitions.append(PortAcquisition(port_name, port_slot, log_writer, args.baud, node_ids,
+                                                capture_writer, args.reconnect_interval, args.read_interval))
+        for acquisition in acquisitions:
+            print(f"Acquiring from {acquisition.port_name} as port {acquisition.port_slot + 1}", flush=True)
+            acquisition.start()
+
+        start = last_stats = time.monotonic()
+        last_cpu, _ = process_usage()
+        while args.duration is None or time.monotonic() - start < args.duration:
+            if not any(acquisition.is_alive() for acquisition in acquisitions):
+                break
+            time.sleep(0.2)
+            now = time.monotonic()
+            if args.stats_interval and now - last_stats >= args.stats_interval:
+                cpu, peak_rss_mb = process_usage()
+                perf_stats.stats.tick()
+                print(format_stats(now - start, 100 * (cpu - last_cpu) / (now - last_stats), peak_rss_mb), flush=True)
+                if args.stats_dump:
+                    perf_stats.stats.dump(args.stats_dump)
+                last_stats, last_cpu = now, cpu
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for acquisition in acquisitions:
+            if acquisition.is_alive():
+                acquisition.stop()
+        log_writer.close()
+        for capture_writer in capture_writers:
+            try:
+                capture_writer.close()
+            except OSError as e:
+                print(f"Can not close capture {capture_writer.path}: {e}", flush=True)
+    counters = perf_stats.stats.counters
+    print(f"{counters.get('frames_received', 0)} frames received, {counters.get('rows_logged', 0)} rows logged, "
+          f"{counters.get('bytes_dropped', 0)} bytes dropped", flush=True)
+    return 1 if any(acquisition.error for acquisition in acquisitions) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
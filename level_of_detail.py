@@ -0,0 +1,103 @@
+import math
+import numpy as np
+from sample_buffer import SampleBuffer
+
+
+def minmax_decimate(timestamps: np.ndarray, values: np.ndarray, bucket_size: int) -> tuple:
+    """
+    Reduce every bucket of bucket_size consecutive samples to its minimum and maximum points,
+    kept in time order, so peaks survive the decimation.
+    Trailing samples which do not fill a bucket are ignored.
+    """
+    count = len(values) // bucket_size
+    if count == 0:
+        return timestamps[:0], values[:0]
+    buckets_t = timestamps[:count * bucket_size].reshape(count, bucket_size)
+    buckets_v = values[:count * bucket_size].reshape(count, bucket_size)
+    index_min = buckets_v.argmin(axis=1)
+    index_max = buckets_v.argmax(axis=1)
+    first = np.minimum(index_min, index_max)
+    second = np.maximum(index_min, index_max)
+    rows = np.arange(count)
+    x = np.empty(2 * count, dtype=np.float64)
+    y = np.empty(2 * count, dtype=np.float64)
+    x[0::2] = buckets_t[rows, first]
+    y[0::2] = buckets_v[rows, first]
+    x[1::2] = buckets_t[rows, second]
+    y[1::2] = buckets_v[rows, second]
+    return x, y
+
+
+class LevelOfDetail:
+    """
+    Multi-resolution min/max view over a SampleBuffer, always returned as float64 arrays.
+    Level k groups 2**k consecutive samples, aligned on their absolute index, into a bucket
+    represented by its min and max points. Every level in use is cached and only extended
+    with the buckets completed since the previous request, so choosing a level on zoom or pan
+    costs a binary search plus the decimation of at most two partial buckets at the edges of the history.
+    """
+    def __init__(self, buffer: SampleBuffer):
+        self._buffer = buffer
+        # level -> [decimated points, index of the first cached bucket]
+        self._levels = {}
+
+    def view(self, x_min: float, x_max: float, max_points: int) -> tuple:
+        """
+        Points to draw for the x range [x_min, x_max], at most about max_points of them.
+        One point on each side of the range is included so lines reach the plot borders.
+        """
+        timestamps = self._buffer.timestamps
+        values = self._buffer.values
+        first = max(int(np.searchsorted(timestamps, x_min, side='left')) - 1, 0)
+        last = min(int(np.searchsorted(timestamps, x_max, side='right')) + 1, len(timestamps))
+        if last - first <= max_points:
+            return timestamps[first:last], values[first:last].astype(np.float64, copy=False)
+
+        level = max(1, math.ceil(math.log2(2 * (last - first) / max_points)))
+        bucket_size = 1 << level
+        points, first_bucket = self._level(level)
+        # Samples before the first and after the last complete bucket, relative to the buffer
+        head_end = first_bucket * bucket_size - self._buffer.start_index
+        tail_start = head_end + len(points) // 2 * bucket_size
+
+        level_x = points.timestamps
+        level_y = points.values
+        level_first = max(int(np.searchsorted(level_x, x_min, side='left')) - 1, 0)
+        level_last = min(int(np.searchsorted(level_x, x_max, side='right')) + 1, len(level_x))
+        parts = [(level_x[level_first:level_last], level_y[level_first:level_last])]
+        if first < head_end:
+            parts.insert(0, minmax_decimate(timestamps[:head_end], values[:head_end], head_end))
+        if last > tail_start:
+            tail = len(timestamps) - tail_start
+            parts.append(minmax_decimate(timestamps[tail_start:], values[tail_start:], tail))
+        if len(parts) == 1:
+            return parts[0]
+        return (np.concatenate([x for x, _ in parts]),
+                np.concatenate([y for _, y in parts]))
+
+    def _level(self, level: int) -> tuple:
+        """
+        Bring the cache of a level up to date with the buffer and return it
+        """
+        bucket_size = 1 << level
+        start = self._buffer.start_index
+        end = start + len(self._buffer)
+        first_bucket = -(-start // bucket_size)
+        end_bucket = end // bucket_size
+
+        cached = self._levels.get(level)
+        if cached is None:
+            cached = self._levels[level] = [SampleBuffer(), first_bucket]
+        points = cached[0]
+        # Forget buckets whose samples were evicted from the buffer
+        if first_bucket > cached[1]:
+            points.discard(2 * (first_bucket - cached[1]))
+            cached[1] = first_bucket
+        cached_end = cached[1] + len(points) // 2
+        if cached_end < end_bucket:
+            begin = cached_end * bucket_size - start
+            stop = end_bucket * bucket_size - start
+            points.extend(*minmax_decimate(self._buffer.timestamps[begin:stop],
+                                           self._buffer.values[begin:stop],
+                                           bucket_size))
+        return points, cached[1]
@@ -0,0 +1,142 @@
+import csv
+import os
+from datetime import datetime
+import numpy as np
+from PySide6.QtCore import (QThread, Signal)
+
+# Bytes parsed per chunk, big enough to amortize the NumPy calls, small enough to keep progress smooth
+default_chunk_size = 8 * 1024 * 1024
+# Timestamp format written by the first versions of the application (QDateTime Qt.TextDate)
+_text_date_format = "%a %b %d %H:%M:%S %Y"
+_ms_per_hour = 3600 * 1000
+
+
+def iso_to_epoch_ms(timestamps: list[str]) -> np.ndarray:
+    """
+    Convert local ISO 8601 timestamps to ms since epoch in bulk.
+    NumPy parses the strings as naive times, the local UTC offset is then looked up once per distinct hour
+    instead of once per row, which also keeps daylight saving changes right.
+    Raises ValueError if any timestamp is not ISO 8601.
+    """
+    naive_ms = np.array(timestamps, dtype='datetime64[ms]').astype(np.int64)
+    hours, inverse = np.unique(naive_ms // _ms_per_hour, return_inverse=True)
+    offsets = np.empty(len(hours), dtype=np.int64)
+    for i, hour in enumerate(hours.tolist()):
+        naive = np.datetime64(hour, 'h').astype(datetime)
+        offsets[i] = int(naive.timestamp() * 1000) - hour * _ms_per_hour
+    return (naive_ms + offsets[inverse]).astype(np.float64)
+
+
+def text_date_to_epoch_ms(timestamps: list[str]) -> np.ndarray:
+    """
+    Slow path for logs written with the former text date format, each distinct second being parsed once.
+    Timestamps which can not be parsed are returned as NaN.
+    """
+    cache = {}
+    result = np.empty(len(timestamps), dtype=np.float64)
+    for i, timestamp in enumerate(timestamps):
+        value = cache.get(timestamp)
+        if value is None:
+            try:
+                value = datetime.strptime(timestamp.strip(), _text_date_format).timestamp() * 1000
+            except ValueError:
+                try:
+                    value = datetime.fromisoformat(timestamp.strip()).timestamp() * 1000
+                except ValueError:
+                    value = np.nan
+            cache[timestamp] = value
+        result[i] = value
+    return result
+
+
+def parse_log_chunk(text: str) -> tuple:
+    """
+    Parse complete lines of a pressure log, as written by CsvLogWriter:
+    timestamp, supply pressure, output pressure, target pressure.
+    The fast path splits the whole chunk at once and converts each column in a single pass.
+    Chunks with quoted fields, blank lines or a wrong number of fields go through the csv module,
+    and rows that can not be parsed are dropped.
+    Returns (timestamps in ms since epoch, supply, output, target), negative pressures meaning no update.
+    """
+    text = text.replace("\r", "").strip("\n")
+    if not text:
+        return np.empty(0), np.empty(0), np.empty(0), np.empty(0)
+    line_count = text.count("\n") + 1
+    fields = text.replace("\n", ",").split(",")
+    if len(fields) != 4 * line_count or '"' in text:
+        rows = [row for row in csv.reader(text.split("\n")) if len(row) == 4]
+        fields = [field for row in rows for field in row]
+    timestamps = fields[0::4]
+    try:
+        pressures = [np.fromiter(map(float, fields[column::4]), dtype=np.float64, count=len(timestamps))
+                     for column in (1, 2, 3)]
+    except ValueError:
+        rows = []
+        for row in zip(timestamps, fields[1::4], fields[2::4], fields[3::4]):
+            try:
+                rows.append((row[0], float(row[1]), float(row[2]), float(row[3])))
+            except ValueError:
+                pass
+        timestamps = [row[0] for row in rows]
+        pressures = [np.array([row[column] for row in rows], dtype=np.float64) for column in (1, 2, 3)]
+    try:
+        epoch_ms = iso_to_epoch_ms(timestamps)
+    except ValueError:
+        epoch_ms = text_date_to_epoch_ms(timestamps)
+    valid = ~np.isnan(epoch_ms)
+    return epoch_ms[valid], pressures[0][valid], pressures[1][valid], pressures[2][valid]
+
+
+def iter_log_chunks(file_name: str, chunk_size: int = default_chunk_size):
+    """
+    Parse a log chunk by chunk, chunks ending on a line boundary, the incomplete last line being carried over.
+    Yields the arrays returned by parse_log_chunk followed by the file position reached.
+    """
+    with open(file_name, 'rb') as log_file:
+        remainder = b""
+        while True:
+            data = log_file.read(chunk_size)
+            if not data:
+                data, remainder = remainder, b""
+            else:
+                data = remainder + data
+                end = data.rfind(b"\n") + 1
+                data, remainder = data[:end], data[end:]
+            if not data:
+                if remainder:
+                    continue
+                return
+            yield *parse_log_chunk(data.decode('utf-8', errors='replace')), log_file.tell()
+
+
+class LogLoader(QThread):
+    """
+    Background loader of a pressure log.
+    The file is read and parsed in chunks off the GUI thread, every parsed chunk is handed over
+    as NumPy arrays to be appended in bulk to the series of a graph, and progress is reported in percent.
+    """
+    chunkLoadedSignal = Signal(object, object, object, object)
+    progressSignal = Signal(int)
+    loadFinishedSignal = Signal(int)
+    loadErrorSignal = Signal(str)
+
+    def __init__(self, file_name: str, chunk_size: int = default_chunk_size, parent=None):
+        super().__init__(parent)
+        self._fileName = file_name
+        self._chunkSize = chunk_size
+
+    def run(self) -> None:
+        row_count = 0
+        try:
+            file_size = max(1, os.path.getsize(self._fileName))
+            for timestamps, supply, output, target, position in iter_log_chunks(self._fileName, self._chunkSize):
+                if self.isInterruptionRequested():
+                    break
+                row_count += len(timestamps)
+                if len(timestamps):
+                    self.chunkLoadedSignal.emit(timestamps, supply, output, target)
+                self.progressSignal.emit(int(100 * position / file_size))
+        except OSError as e:
+            self.loadErrorSignal.emit(str(e))
+            return
+        self.loadFinishedSignal.emit(row_count)
@@ -1,20 +1,24 @@
+import time
+# Measured as early as possible to report the startup time of the application
+startup_begin = time.perf_counter()
+
 from PySide6.QtWidgets import (QDialog, QApplication, QVBoxLayout,QHBoxLayout,
                                QPushButton,QCheckBox,QGridLayout,QSizePolicy,
                                QComboBox,QLabel,QLineEdit,
                                QMainWindow,QWidget,QMenu,QFileDialog,
-                               QMessageBox,QPlainTextEdit
+                               QMessageBox,QPlainTextEdit,QProgressDialog
                                )
-from PySide6.QtCharts import (QChart, QLineSeries, QChartView,QValueAxis, QDateTimeAxis)
 from PySide6.QtGui import (QAction)
-from PySide6.QtCore import (Qt, QDateTime, Slot,QTimer, Signal)
-from graph import *
+from PySide6.QtCore import (Qt, QDateTime, Slot,QTimer, Signal, QCoreApplication, QEvent)
 from graph_manager import *
+import os
 import sys
-import serial
-import serial.tools.list_ports as list_ports
-import struct
 import style_sheet
 import protocol_parser
+import perf_stats
+from serial_connection import SerialConnection
+from transmit_queue import Command
+from serial_log_view import SerialLogView, SENT_FRAME
 
 
 class MainWindow(QMainWindow):
@@ -24,12 +28,25 @@ class MainWindow(QMainWindow):
         
         super().__init__()
         self.setStyleSheet(style_sheet.main_window)
-        self.serialPort = None
+        # Connected controllers keyed on port slot, see protocol_parser.nodes_per_port
+        self._connections = {}
+        # Raw capture file chosen by the user and the writer of every port, see captureWriterFor
+        self._capturePath = None
+        self._captureWriters = {}
+        self._logLoader = None
+        self._replaySource = None
+        self._profileRunner = None
+        self._perfStatsDialog = None
+        self._perfStatsPanelOpen = False
+        self._perfStatsDumpPath = None
+        self._perfStatsTimer = None
         self.setWindowTitle("Pressure Monitoring Tool")
         self.setGeometry(100, 100, 700, 400)
 
         self._graphManager = GraphManager(self)
-        self._graphManager.initializeInternalVar([i for i in range (1,17)],"mbar",0.0,14000.0)
+        # Nodes are discovered from the frames received, see onNodeDiscovered
+        self._graphManager.initializeInternalVar([],"mbar",0.0,14000.0)
+        self._graphManager.nodeDiscoveredSignal.connect(self.onNodeDiscovered)
         central_widget = QWidget()
         self.setCentralWidget(central_widget)
 
@@ -76,11 +93,17 @@ class MainWindow(QMainWindow):
         
 
 
-        for i in range (1,17):
-            self._selectedGraphCombobox.addItem(f"Node {i}")
-            self._targetNodeComboBox.addItem(f"Node {i}")
+        # Items of the node comboboxes hold the global node id and are added as nodes are discovered.
+        # The target node can also be typed, to command a node which does not send its pressure yet
         self._selectedGraphCombobox.addItem(f"All Graph")
+        self._targetNodeComboBox.setEditable(True)
+        self._targetNodeComboBox.setInsertPolicy(QComboBox.NoInsert)
+        self._targetNodeComboBox.lineEdit().setPlaceholderText("Node id, e.g. 3 or Port 2 Node 3")
         self._serialCombobox = QComboBox(self)
+        # Editable so a port which is not listed, e.g. the pseudo-terminal of simulator.py, can be typed
+        self._serialCombobox.setEditable(True)
+        self._serialCombobox.setInsertPolicy(QComboBox.NoInsert)
+        self._serialCombobox.currentTextChanged.connect(self.updateConnectButton)
 # raw send widgets
         self._rawLineEdit = QLineEdit(self)
         self._rawLineEdit.setPlaceholderText("Enter raw hex, e.g. DE AD BE EF")
@@ -93,9 +116,7 @@ class MainWindow(QMainWindow):
         self._logging.setPlaceholderText("System Logging")
         self._logging.setMinimumHeight(120)
 
-        self._serialLogging = QPlainTextEdit(self)
-        self._serialLogging.setReadOnly(True)
-        self._serialLogging.setPlaceholderText("Serial Logging")
+        self._serialLogging = SerialLogView(parent=self)
         self._serialLogging.setMinimumHeight(120)
 
         self._loggingLayout = QHBoxLayout()
@@ -128,12 +149,22 @@ class MainWindow(QMainWindow):
         self.layout.setVerticalSpacing(10)
         self.layout.setContentsMargins(12, 12, 12, 12)
 
-        self._collectDataTimer = QTimer(self)
-        self._collectDataTimer.timeout.connect(self.update_data)
-        self._collectDataTimer.start(10)
+        # Handlers of decoded frames, keyed on frame kind. Atmosphere pressure is not displayed yet
+        FrameKind = protocol_parser.FrameKind
+        self._frameHandlers = {
+            FrameKind.SUPPLY_PRESSURE: self.onSupplyPressureFrame,
+            FrameKind.NODE_PRESSURE: self.onNodePressureFrame,
+            FrameKind.NODE_PRESSURE_IN_DEVELOPMENT: self.onNodePressureFrame,
+            FrameKind.MANUAL_MODE_ENTER: self.onManualModeEnterFrame,
+            FrameKind.MANUAL_MODE_EXIT: self.onManualModeExitFrame,
+            FrameKind.VALVE_FEEDBACK: self.onValveFeedbackFrame,
+        }
 
     def onSendRaw(self):
-        if self.serialPort is not None:
+        """
+        Send a raw frame to the port selected in the serial combobox, or to the first port connected
+        """
+        if self._connections:
             text = self._rawLineEdit.text().strip()
             if not text:
                 return
@@ -149,151 +180,299 @@ class MainWindow(QMainWindow):
                 self._rawLineEdit.clear()
                 return
 
-            try:
-                self.serial_log(' '.join(f"{b:02x}" for b in raw))
-                self.serialPort.write(raw)
-                self.serialPort.flush()
-            except Exception as e:
-                QMessageBox.critical(self,"Error","Fail to send data",QMessageBox.Ok)
+            connection = self.selectedConnection() or self._connections[min(self._connections)]
+            self.sendCommand(Command(raw, description="Raw frame"), connection.port_slot)
+
+    @Slot(QDateTime, list, list)
+    def update_data(self, now: QDateTime, batch: list, log_lines: list):
+        """
+        Update status on graph with a batch of frames received by the serial reader thread
+        Every decoded frame is dispatched to its handler through _frameHandlers
+        The serial log lines of the batch are formatted by the reader thread already
+        """
+        stats_enabled = perf_stats.enabled
+        if stats_enabled:
+            dispatch_start = time.perf_counter()
+            if self._replaySource is None:
+                perf_stats.stats.record("queue", (QDateTime.currentMSecsSinceEpoch() - now.toMSecsSinceEpoch()) / 1000)
+        self._serialLogging.add_lines(log_lines)
+        frame_handlers = self._frameHandlers
+        for byte, frame_record in batch:
+            handler = frame_handlers.get(frame_record.kind)
+            if handler is not None:
+                handler(now, frame_record)
+        if stats_enabled:
+            stats = perf_stats.stats
+            stats.record("dispatch", time.perf_counter() - dispatch_start)
+            stats.count("frames_dispatched", len(batch))
+            stats.count("batches_handled")
+
+    def onSupplyPressureFrame(self, now: QDateTime, frame_record: protocol_parser.FrameRecord):
+        # Supply pressure frames carry the id 0 of their controller, so only its nodes get the value
+        self._graphManager.supplyPressureUpdate(now,frame_record.value,protocol_parser.split_node_id(frame_record.node_id)[0])
+
+    def onNodePressureFrame(self, now: QDateTime, frame_record: protocol_parser.FrameRecord):
+        self._graphManager.pressureInformationUpdate(frame_record.node_id,now,-1.0,-1.0,frame_record.value)
+
+    def acknowledgeCommand(self, frame_record: protocol_parser.FrameRecord):
+        """
+        Command answered by a feedback frame, None when no command waits for it
+        """
+        connection = self._connections.get(protocol_parser.split_node_id(frame_record.node_id)[0])
+        if connection is None:
+            return None
+        command = connection.transmitQueue.acknowledge(frame_record)
+        if command is None:
+            self.log(f"Unexpected feedback from node {frame_record.node_id}")
+        return command
+
+    def onManualModeEnterFrame(self, now: QDateTime, frame_record: protocol_parser.FrameRecord):
+        self.acknowledgeCommand(frame_record)
+        if frame_record.value == 0x0:
+            self.log("Manual mode entered successfully")
+            self._manualModeButton.setText("Auto")
+        else:
+            self.log("Can not enter manual mode")
+
+    def onManualModeExitFrame(self, now: QDateTime, frame_record: protocol_parser.FrameRecord):
+        self.acknowledgeCommand(frame_record)
+        if frame_record.value == 0x00:
+            self._manualModeButton.setText("Manual")
+            self.log("Auto mode returned")
+        else:
+            self.log("Can not exit manual mode")
+
+    def onValveFeedbackFrame(self, now: QDateTime, frame_record: protocol_parser.FrameRecord):
+        command = self.acknowledgeCommand(frame_record)
+        if frame_record.value == 0x00:
+            if command is not None:
+                self.log(f"{command.description} requested")
+            else:
+                # Command of another host or feedback arriving after a retry, the valve moved all the same
+                self.log(f"Valve status confirmed on {protocol_parser.node_label(frame_record.node_id)}")
+        else:
+            self.log("Can not control valve!! enter manual mode first")
 
-    def update_data(self):
+    @Slot(int, str)
+    def onSerialError(self, port_slot: int, error: str):
         """
-        Update status on graph with the serial data available
+        The reader or the transmit thread of a port lost access to it
         """
-        if self.serialPort == None:
+        connection = self._connections.get(port_slot)
+        if connection is None:
             return
-        now = QDateTime.currentDateTime()
+        QMessageBox.critical(self,"Error",f"Can not access serial port {connection.port_name}!!",QMessageBox.Ok)
+        self.disconnectPort(port_slot)
+        self.onListSerialPort()
+
+    def connectPort(self, port_name: str) -> SerialConnection:
+        """
+        Open a serial port in the first free slot and start its acquisition and transmit threads
+        Nodes of ports after the first one are added to the graphs and the node comboboxes
+        """
+        port_slot = next(slot for slot in range(len(self._connections) + 1) if slot not in self._connections)
+        connection = SerialConnection(port_name, port_slot, self)
+        connection.reader.framesReceivedSignal.connect(self.update_data)
+        connection.reader.captureErrorSignal.connect(self.onCaptureError)
+        connection.transmitQueue.framesSentSignal.connect(self.onCommandsSent)
+        connection.transmitQueue.commandFailedSignal.connect(self.onCommandFailed)
+        connection.connectionErrorSignal.connect(self.onSerialError)
+        # Registered before anything else can fail, so the port is always closed by disconnectPort
+        self._connections[port_slot] = connection
         try:
-            if self.serialPort.in_waiting >= protocol_parser.default_frame_length:
-                byte = self.serialPort.read(protocol_parser.default_frame_length)
-                self.serial_log(' '.join(f"{b:02x}" for b in byte))
-                frame_information = protocol_parser.get_data_from_frame(byte)
-                if frame_information[0] == "AtmospherePressure":
-                    ...
-                elif frame_information[0] == "SupplyPressure":
-                    for i in range (1,17):
-                        self._graphManager.pressureInformationUpdate(i,now,frame_information[1],-1.0,-1.0)
-                elif frame_information[0] == "NodePressure" or frame_information[0] == "NodePressureInDevelopment":
-                    self._graphManager.pressureInformationUpdate(frame_information[1],now,-1.0,-1.0,frame_information[2])
-                elif frame_information[0] == "ManualModeEnter":
-                    if frame_information[1] == 0x0:
-                        self.log("Manual mode entered successfully")
-                        self._manualModeButton.setText("Auto")
-                    else:
-                        self.log("Can not enter manual mode")
-                elif frame_information[0] == "ManualModeExit": 
-                    if frame_information[1] == 0x00:
-                        self._manualModeButton.setText("Manual")
-                        self.log("Auto mode returned")
-                    else:
-                        self.log("Can not exit manual mode")
-                elif frame_information[0] == "ValveFeedback":
-                    if frame_information[1] == 0x00:
-                        self.log(f"{self._valveStatusCombobox.currentText()} requested")
-                    else:
-                        self.log("Can not control valve!! enter manual mode first")
-
-        except:
-            QMessageBox.critical(self,"Error","Can not access serial port!!",QMessageBox.Ok)
-            self.serialPort = None
-            self.onListSerialPort()
-            self._connectButton.setText("🔌 Connect")
+            connection.reader.setCaptureWriter(self.captureWriterFor(port_slot))
+        except OSError as e:
+            # The port is usable, only the capture of a running recording can not go on
+            QMessageBox.critical(self,"Error","Can not create capture file",QMessageBox.Ok)
+            self.onCaptureError(str(e))
+        connection.start()
+        self.updateConnectButton()
+        return connection
+
+    def disconnectPort(self, port_slot: int):
+        """
+        Stop the threads of a port and close it, the data of its nodes stays in the graphs
+        A running profile is stopped first as it may command nodes of this port
+        """
+        connection = self._connections.pop(port_slot, None)
+        if connection is None:
+            return
+        self.stopProfile()
+        connection.close()
+        connection.deleteLater()
+        writer = self._captureWriters.get(port_slot)
+        if writer is not None:
+            try:
+                writer.flush()
+            except OSError as e:
+                self.onCaptureError(str(e))
+        self.updateConnectButton()
+
+    def disconnectAll(self):
+        for port_slot in list(self._connections):
+            self.disconnectPort(port_slot)
+
+    @Slot(int)
+    def onNodeDiscovered(self, node_id: int):
+        """
+        Add a node which reported its pressure for the first time to the node comboboxes, in node id order
+        """
+        label = protocol_parser.node_label(node_id)
+        for combobox in (self._selectedGraphCombobox, self._targetNodeComboBox):
+            index = 0
+            while index < combobox.count() and combobox.itemData(index) is not None and combobox.itemData(index) < node_id:
+                index += 1
+            combobox.insertItem(index, label, userData=node_id)
+        if self._targetNodeComboBox.count() == 1:
+            self._targetNodeComboBox.setCurrentIndex(0)
+
+    def selectedTargetNode(self) -> int:
+        """
+        Global id of the node selected in the target node combobox, or typed in it as "3" or "Port 2 Node 3"
+        Raises ValueError for a text which is not a node
+        """
+        text = self._targetNodeComboBox.currentText().strip()
+        index = self._targetNodeComboBox.findText(text)
+        if index >= 0:
+            return self._targetNodeComboBox.itemData(index)
+        return protocol_parser.parse_node_label(text)
+
+    def selectedConnection(self):
+        """
+        Connection of the port selected in the serial combobox, None when it is not connected
+        """
+        port_name = self.selectedSerialPort()
+        return next((connection for connection in self._connections.values() if connection.port_name == port_name), None)
+
+    def updateConnectButton(self):
+        self._connectButton.setText("❌ Disconnect" if self.selectedConnection() is not None else "🔌 Connect")
+        self._sendRawButton.setEnabled(bool(self._connections))
+
+    def sendCommand(self, command: Command, port_slot: int = None):
+        """
+        Queue a command for the transmit thread of its port, it is logged once written
+        The port is the one of the node the command is meant for unless given
+        """
+        if port_slot is None:
+            port_slot = protocol_parser.split_node_id(command.node_id)[0]
+        connection = self._connections.get(port_slot)
+        if connection is None:
+            self.log(f"Port {port_slot + 1} is not connected, {command.description} not sent")
+            return
+        connection.transmitQueue.send(command)
+
+    @Slot(list)
+    def onCommandsSent(self, commands: list):
+        for command in commands:
+            retry = f" (retry {command.attempts - 1})" if command.attempts > 1 else ""
+            self.serial_log(command.frame.hex(' ') + retry, command.node_id)
+
+    @Slot(object)
+    def onCommandFailed(self, command: Command):
+        node = protocol_parser.node_label(command.node_id) if command.node_id is not None else f"node {command.frame[1]}"
+        self.log(f"No answer from {node} to {command.description} after {command.attempts} attempts")
 
     def onShowGraphButtonClicked(self):
         """
         Displaying graph based on index of selected graph combobox
         """
-        if self._selectedGraphCombobox.currentIndex() + 1 == self._selectedGraphCombobox.count():
-            for i in range (1,17):
+        node_id = self._selectedGraphCombobox.currentData()
+        if node_id is None:
+            for i in self._graphManager.nodeIds():
                 self._graphManager.showGraphBasedOnID(i)
         else:
-            self._graphManager.showGraphBasedOnID(self._selectedGraphCombobox.currentIndex() + 1)
+            self._graphManager.showGraphBasedOnID(node_id)
     
     def onListSerialPort(self):
         """
         List all available COM port on a combobox
         """
+        import serial.tools.list_ports as list_ports
         self._serialCombobox.clear()
         ports = list_ports.comports()
         if not ports:
-            self._serialCombobox.addItem("No serial ports found")
-            self._serialCombobox.setEnabled(False)
+            self._serialCombobox.lineEdit().setPlaceholderText("No serial ports found")
             return
-        self._serialCombobox.setEnabled(True)
         for port in ports:
             desc = f"{port.device} - {port.description}"
             self._serialCombobox.addItem(desc, userData=port.device)
 
+    def selectedSerialPort(self) -> str:
+        """
+        Device of the listed port shown in the serial combobox, or the text typed in it
+        """
+        text = self._serialCombobox.currentText().strip()
+        index = self._serialCombobox.findText(text)
+        if index >= 0 and self._serialCombobox.itemData(index):
+            return self._serialCombobox.itemData(index)
+        return text.split(" - ")[0]
+
     def onConnectSerial(self):
         """
-        Connect to a serial port selected
+        Connect to the serial port selected, or disconnect it when it is connected already
+        Several ports can be connected at once, one per controller
         """
-        if self._connectButton.text() == "🔌 Connect":
+        connection = self.selectedConnection()
+        if connection is None:
+            if self._replaySource is not None:
+                QMessageBox.critical(self,"Error","Stop the replay before connecting",QMessageBox.Ok)
+                return
+            port_name = self.selectedSerialPort()
+            if not port_name:
+                QMessageBox.critical(self,"Error","No port available",QMessageBox.Ok)
+                return
             try:
-                if self._serialCombobox.count() > 0:
-                    self.serialPort = serial.Serial(f"{self._serialCombobox.currentText()[:4]}",115200, timeout=1)
-                    self._connectButton.setText("❌ Disconnect")
-                    self.log("Connect Serial port successfully")
-                else:
-                    QMessageBox.critical(self,"Error","No port available",QMessageBox.Ok)
-                    return
+                connection = self.connectPort(port_name)
             except Exception as e:
                 QMessageBox.critical(self,"Error","Can not access serial port",QMessageBox.Ok)
                 return
-            self._connectButton.setText("❌ Disconnect")
-            self._sendRawButton.setEnabled(True)
+            self.log(f"Connect Serial port successfully: {connection.label}")
         else:
-            self._connectButton.setText("🔌 Connect")
-            self.serialPort.flush()
-            self.serialPort.close()
-            self._sendRawButton.setEnabled(False)
-            self.serialPort = None
-            self.log("Disconnect Succesfully")
+            self.disconnectPort(connection.port_slot)
+            self.log(f"Disconnect Succesfully: {connection.label}")
 
     def onTargetButton(self):
         """
         Send corresponding command to controller to set target pressure to a node
         """
         try:
-            if self.serialPort is not None:
-                node_id = self._targetNodeComboBox.currentIndex() + 1
+            if self._connections:
+                node_id = self.selectedTargetNode()
+                local_id = protocol_parser.split_node_id(node_id)[1]
                 target_pressure = float(self._targetPressureLineEdit.text())
-                command = protocol_parser.set_target_pressure(target_pressure,node_id)
-                self.serialPort.write(command)
-                self.serial_log(' '.join(f"{b:02x}" for b in command))
+                command = protocol_parser.set_target_pressure(target_pressure,local_id)
+                self.sendCommand(Command(command, node_id, f"Target pressure {target_pressure} mbar"))
                 self._graphManager.pressureInformationUpdate(node_id,QDateTime.currentDateTime(),-1.0,target_pressure,-1.0)
-                self.serialPort.flush()
         except Exception as e:
             QMessageBox.critical(self,"Error",f"Fail to send target pressure to node",QMessageBox.Ok)
 
     def onManualMode(self):
         try:
-            if self.serialPort is not None:
-                node_id = self._targetNodeComboBox.currentIndex() + 1
+            if self._connections:
+                node_id = self.selectedTargetNode()
+                local_id = protocol_parser.split_node_id(node_id)[1]
                 flag = True if self._manualModeButton.text() == "Manual" else False
-                command = protocol_parser.set_manual_mode_adjust(node_id,flag)
-                self.serialPort.write(command)
-                self.serial_log(' '.join(f"{b:02x}" for b in command))
-                self.serialPort.flush()
+                command = protocol_parser.set_manual_mode_adjust(local_id,flag)
+                self.sendCommand(Command(command, node_id, "Manual mode" if flag else "Auto mode"))
         except Exception as e:
             QMessageBox.critical(self,"Error",f"Can not send command to pump",QMessageBox.Ok)
 
     def onValveStatusRequest(self):
         try:
-            if self.serialPort is not None:
-                node_id = self._targetNodeComboBox.currentIndex() + 1
+            if self._connections:
+                node_id = self.selectedTargetNode()
+                local_id = protocol_parser.split_node_id(node_id)[1]
                 valve_status = self._valveStatusCombobox.currentIndex()
-                command = protocol_parser.set_valve(node_id,valve_status)
-                self.serialPort.write(command)
-                self.serial_log(' '.join(f"{b:02x}" for b in command))
-                self.serialPort.flush()
+                command = protocol_parser.set_valve(local_id,valve_status)
+                self.sendCommand(Command(command, node_id, self._valveStatusCombobox.currentText()))
         except Exception as e:
             QMessageBox.critical(self,"Error",f"Can not send command to pump",QMessageBox.Ok)
 
     def onSendingTypeRequest(self):
         try:
-            if self.serialPort is not None:
-                node_id = self._targetNodeComboBox.currentIndex() + 1
+            if self._connections:
+                node_id = self.selectedTargetNode()
+                local_id = protocol_parser.split_node_id(node_id)[1]
                 cyclic = 0x1 if self._sendingTypeButton.text() == "↻ Cyclic" else 0x0
                 command = []
                 if cyclic == 0x01:
@@ -302,14 +481,12 @@ class MainWindow(QMainWindow):
                     except:
                         QMessageBox.critical(self,"Error",f"Invalid cycle input",QMessageBox.Ok)
                         return
-                    command = protocol_parser.sending_type_command(node_id,cyclic,cycle_time)
+                    command = protocol_parser.sending_type_command(local_id,cyclic,cycle_time)
                     self._sendingTypeButton.setText("⚡On Request")
                 else:
-                    command = protocol_parser.sending_type_command(node_id,cyclic,0)
+                    command = protocol_parser.sending_type_command(local_id,cyclic,0)
                     self._sendingTypeButton.setText("↻ Cyclic")
-                self.serialPort.write(command)
-                self.serialPort.flush() 
-                self.serial_log(' '.join(f"{b:02x}" for b in command))   
+                self.sendCommand(Command(command, node_id, "Sending type"))
         except Exception as e:
             QMessageBox.critical(self,"Error",f"Can not send command to pump",QMessageBox.Ok)
 
@@ -324,20 +501,278 @@ class MainWindow(QMainWindow):
         "",
         "CSV Files (*.csv);;All Files (*)")
         if file_name:
+            from graph import GraphDialog
+            from log_loader import LogLoader
+            self.stopLogLoader()
             self._logPlayingDialog = GraphDialog(f"{file_name}",0,"Time","Pressure","s","mbar",0.0,14000.0)
-            fieldnames = ["timestamp", "supply_pressure", "output_pressure", "target_pressure"]
-            with open(file_name, "r") as csv_file:
-                reader = csv.DictReader(csv_file, fieldnames=fieldnames)
-                for _, row in enumerate(reader, start=1):
-                    timestamp_str = row["timestamp"]
-                    supply_s = row["supply_pressure"]
-                    output_s = row["output_pressure"]
-                    target_s = row["target_pressure"]
-                    self._logPlayingDialog.pressure_update(0,QDateTime.fromString(timestamp_str),
-                                                           float(supply_s),
-                                                           float(target_s),
-                                                           float(output_s))
-            self._logPlayingDialog.exec()
+            self._logLoader = LogLoader(file_name, parent=self)
+            self._logLoader.chunkLoadedSignal.connect(self._logPlayingDialog.load_pressure_data)
+            self._logLoader.loadFinishedSignal.connect(self.onLogLoaded)
+            self._logLoader.loadErrorSignal.connect(self.onLogLoadError)
+
+            self._logProgressDialog = QProgressDialog("Loading log...", "Cancel", 0, 100, self)
+            self._logProgressDialog.setWindowTitle(file_name)
+            self._logProgressDialog.setMinimumDuration(500)
+            self._logProgressDialog.canceled.connect(self.stopLogLoader)
+            self._logLoader.progressSignal.connect(self._logProgressDialog.setValue)
+            self._logLoader.start()
+            self._logPlayingDialog.show()
+
+    @Slot(int)
+    def onLogLoaded(self, row_count: int):
+        self._logProgressDialog.reset()
+        self._logPlayingDialog.show_all_data()
+        self.log(f"Loaded {row_count} rows from {self._logPlayingDialog.graph_name}")
+
+    @Slot(str)
+    def onLogLoadError(self, error: str):
+        self._logProgressDialog.reset()
+        QMessageBox.critical(self,"Error",f"Can not read log file: {error}",QMessageBox.Ok)
+
+    def stopLogLoader(self):
+        """
+        Cancel the log being loaded, if any, keeping the rows loaded so far
+        """
+        if self._logLoader is not None:
+            self._logLoader.requestInterruption()
+            self._logLoader.wait()
+            self._logLoader.deleteLater()
+            self._logLoader = None
+
+    def onToggleCapture(self):
+        """
+        Start or stop recording every received frame to a raw binary capture file
+        The capture keeps running across reconnections until it is stopped
+        """
+        import capture
+        if self._capturePath is None:
+            default_name = f"{QDateTime.currentDateTime().toString('yyyy-MM-dd_HH-mm-ss')}_capture{capture.capture_extension}"
+            file_name, _ = QFileDialog.getSaveFileName(
+            self,
+            "Save Raw Capture",
+            default_name,
+            f"Raw Captures (*{capture.capture_extension});;All Files (*)")
+            if not file_name:
+                return
+            self._capturePath = file_name
+            try:
+                for port_slot, connection in self._connections.items():
+                    connection.reader.setCaptureWriter(self.captureWriterFor(port_slot))
+            except OSError as e:
+                QMessageBox.critical(self,"Error",f"Can not create capture file",QMessageBox.Ok)
+                self.stopCapture()
+                return
+            self.log(f"Raw capture started: {file_name}")
+        else:
+            self.stopCapture()
+
+    def captureWriterFor(self, port_slot: int):
+        """
+        Capture writer of a port while a capture runs, None otherwise
+        Frames only carry the node ids of their controller, so every port is recorded to its own file:
+        the file chosen for the first port, suffixed with _port<N> for the others
+        """
+        if self._capturePath is None:
+            return None
+        writer = self._captureWriters.get(port_slot)
+        if writer is None:
+            import capture
+            path = self._capturePath
+            if port_slot > 0:
+                root, extension = os.path.splitext(path)
+                path = f"{root}_port{port_slot + 1}{extension}"
+            writer = self._captureWriters[port_slot] = capture.CaptureWriter(path, port_slot=port_slot)
+        return writer
+
+    def onCaptureError(self, error: str):
+        """
+        A reader could not write its capture and detached it, the whole capture is stopped while acquisition goes on
+        """
+        if self._capturePath is None:
+            return
+        self.log(f"Raw capture failed: {error}")
+        self.stopCapture()
+
+    def stopCapture(self):
+        """
+        Detach the captures from the reader threads before closing their files
+        """
+        if self._capturePath is None:
+            return
+        for connection in self._connections.values():
+            connection.reader.setCaptureWriter(None)
+        for writer in self._captureWriters.values():
+            try:
+                writer.close()
+            except OSError as e:
+                self.log(f"Can not close raw capture {writer.path}: {e}")
+                continue
+            self.log(f"Raw capture stopped: {writer.frame_count} frames saved to {writer.path}")
+        self._captureWriters = {}
+        self._capturePath = None
+
+    def onReplaySession(self):
+        """
+        Replay a raw capture or a CSV log through the same path as the frames received from the serial port
+        """
+        if self._connections:
+            QMessageBox.critical(self,"Error","Disconnect the serial ports before replaying a session",QMessageBox.Ok)
+            return
+        import capture
+        file_name, _ = QFileDialog.getOpenFileName(
+        self,
+        "Replay Session",
+        "",
+        f"Sessions (*{capture.capture_extension} *.csv);;All Files (*)")
+        if not file_name:
+            return
+        import replay
+        self.stopReplay()
+        try:
+            self._replaySource = replay.open_session(file_name, self)
+        except (OSError, ValueError) as e:
+            QMessageBox.critical(self,"Error","Can not read session file",QMessageBox.Ok)
+            return
+        self._graphManager.clearData()
+        self._replaySource.framesReceivedSignal.connect(self.update_data)
+        self._replaySource.seekedSignal.connect(self._graphManager.clearData)
+        self._replayDialog = replay.ReplayDialog(self._replaySource, file_name, self)
+        self._replayDialog.replayClosedSignal.connect(self.stopReplay)
+        self._replaySource.start()
+        self._replayDialog.show()
+        self.log(f"Replaying {len(self._replaySource)} frames from {file_name}")
+
+    def stopReplay(self):
+        """
+        Stop the replay thread, if any, the replayed data stays in the graphs
+        """
+        if self._replaySource is not None:
+            self._replaySource.stop()
+            self._replaySource.deleteLater()
+            self._replaySource = None
+
+    def onToggleProfile(self):
+        """
+        Run a setpoint profile file on the connected controller, or stop the one running
+        """
+        if self._profileRunner is not None:
+            self.stopProfile()
+            return
+        if not self._connections:
+            QMessageBox.critical(self,"Error","Connect the serial port before running a profile",QMessageBox.Ok)
+            return
+        file_name, _ = QFileDialog.getOpenFileName(
+        self,
+        "Run Setpoint Profile",
+        "",
+        "Profiles (*.json);;All Files (*)")
+        if file_name:
+            self.startProfile(file_name)
+
+    def startProfile(self, file_name: str):
+        import profile_scheduler
+        try:
+            profile = profile_scheduler.load_profile(file_name)
+        except (OSError, ValueError) as e:
+            QMessageBox.critical(self,"Error",f"Can not load profile: {e}",QMessageBox.Ok)
+            return
+        # The profile thread routes every command to the transmit queue of its port, which are all thread safe
+        transmit_queues = {port_slot: connection.transmitQueue for port_slot, connection in self._connections.items()}
+        missing = sorted({protocol_parser.split_node_id(node_id)[0] + 1 for node_id in profile.node_ids}
+                         - {port_slot + 1 for port_slot in transmit_queues})
+        if missing:
+            QMessageBox.critical(self,"Error",f"Profile uses ports which are not connected: {missing}",QMessageBox.Ok)
+            return
+
+        def send(command: Command):
+            transmit_queues[protocol_parser.split_node_id(command.node_id)[0]].send(command)
+        self._profileRunner = profile_scheduler.ProfileRunner(profile, send, self)
+        self._profileRunner.setpointsSentSignal.connect(self.onProfileSetpoints)
+        self._profileRunner.progressSignal.connect(self._graphManager.profileProgressUpdate)
+        self._profileRunner.profileFinishedSignal.connect(self.onProfileFinished)
+        self._graphManager.startProfile(profile)
+        self._profileRunner.start()
+        self.log(f"Profile {profile.name} started on {len(profile.node_ids)} nodes for {profile.duration_s:.0f} s")
+
+    @Slot(list)
+    def onProfileSetpoints(self, setpoints: list):
+        """
+        Store the targets commanded by the profile in the target series of their node
+        """
+        for node_id, timestamp_ms, kind, value in setpoints:
+            if kind == "target":
+                self._graphManager.pressureInformationUpdate(node_id,QDateTime.fromMSecsSinceEpoch(int(timestamp_ms)),-1.0,value,-1.0)
+
+    @Slot()
+    def onProfileFinished(self):
+        if self._profileRunner is None or self.sender() is not self._profileRunner:
+            return
+        self.log(f"Profile {self._profileRunner.profile.name} finished, "
+                 f"largest scheduling delay {self._profileRunner.max_jitter_s * 1000:.2f} ms")
+        self.stopProfile()
+
+    def stopProfile(self):
+        """
+        Stop the profile thread, if any, the targets already sent stay applied
+        """
+        if self._profileRunner is not None:
+            self._profileRunner.stop()
+            self._profileRunner.deleteLater()
+            self._profileRunner = None
+            self._graphManager.stopProfile()
+
+    def onShowPerfStats(self):
+        """
+        Show the performance statistics panel, statistics are collected while it is open
+        """
+        from perf_stats_view import PerfStatsDialog
+        if self._perfStatsDialog is None:
+            self._perfStatsDialog = PerfStatsDialog(self)
+            self._perfStatsDialog.statsDialogClosedSignal.connect(self.onPerfStatsClosed)
+        self._perfStatsDialog.show()
+        self._perfStatsPanelOpen = True
+        self.updatePerfStatsCollection()
+
+    def onPerfStatsClosed(self):
+        self._perfStatsPanelOpen = False
+        self.updatePerfStatsCollection()
+
+    def startPerfStatsDump(self, path: str, interval_s: float = 5.0):
+        """
+        Append a JSON snapshot of the performance statistics to path every interval_s seconds
+        """
+        self._perfStatsDumpPath = path
+        self._perfStatsDumpInterval = max(1, round(interval_s))
+        self.updatePerfStatsCollection()
+
+    def updatePerfStatsCollection(self):
+        """
+        Collect statistics only while the panel is open or a dump is running, so they cost nothing otherwise
+        Rates are updated every second by the statistics timer
+        """
+        collecting = self._perfStatsDumpPath is not None or self._perfStatsPanelOpen
+        perf_stats.set_enabled(collecting)
+        if collecting and self._perfStatsTimer is None:
+            self._perfStatsTicks = 0
+            self._perfStatsTimer = QTimer(self)
+            self._perfStatsTimer.timeout.connect(self.onPerfStatsTick)
+            self._perfStatsTimer.start(1000)
+        elif not collecting and self._perfStatsTimer is not None:
+            self._perfStatsTimer.stop()
+            self._perfStatsTimer = None
+
+    def onPerfStatsTick(self):
+        perf_stats.stats.tick()
+        if self._perfStatsDialog is not None:
+            self._perfStatsDialog.refresh()
+        self._perfStatsTicks += 1
+        if self._perfStatsDumpPath is not None and self._perfStatsTicks % self._perfStatsDumpInterval == 0:
+            try:
+                perf_stats.stats.dump(self._perfStatsDumpPath)
+            except OSError as e:
+                self.log(f"Can not dump performance statistics: {e}")
+                self._perfStatsDumpPath = None
+                self.updatePerfStatsCollection()
 
     def contextMenuEvent(self, event):
 
@@ -348,8 +783,23 @@ class MainWindow(QMainWindow):
         read_file.triggered.connect(self.onOpenLog)
         clear_logging = QAction("❌Clear logging",self)
         clear_logging.triggered.connect(self.clear_log)
+        raw_capture = QAction("⏹ Stop raw capture" if self._capturePath is not None else "⏺ Start raw capture",self)
+        raw_capture.triggered.connect(self.onToggleCapture)
         menu.addAction(refresh_action)
         menu.addAction(read_file)
+        menu.addAction(raw_capture)
+        replay_session = QAction("▶ Replay a session",self)
+        replay_session.triggered.connect(self.onReplaySession)
+        menu.addAction(replay_session)
+        run_profile = QAction("⏹ Stop profile" if self._profileRunner is not None else "⏱ Run a setpoint profile",self)
+        run_profile.triggered.connect(self.onToggleProfile)
+        menu.addAction(run_profile)
+        show_dashboard = QAction("🗔 Dashboard of all nodes",self)
+        show_dashboard.triggered.connect(self._graphManager.showDashboard)
+        menu.addAction(show_dashboard)
+        show_stats = QAction("📊 Performance statistics",self)
+        show_stats.triggered.connect(self.onShowPerfStats)
+        menu.addAction(show_stats)
         menu.addAction(clear_logging)
         menu.exec(event.globalPos())
 
@@ -361,17 +811,43 @@ class MainWindow(QMainWindow):
         timestamp = QDateTime.currentDateTime().toString()
         self._logging.appendPlainText(f"{timestamp} {content}" )
 
-    def serial_log(self, content: str):
+    def serial_log(self, content: str, node_id: int = None):
+        """
+        Log a frame sent to the controller
+        """
         timestamp = QDateTime.currentDateTime().toString("hh:mm:ss.zzz")
-        self._serialLogging.appendPlainText(f"{timestamp} {content}" )
+        self._serialLogging.add_line(SENT_FRAME, node_id, f"{timestamp} {content}")
+
+    def reportStartupTime(self):
+        """
+        Log the time elapsed from the start of the process to the first event loop iteration after showing the window
+        """
+        self.log(f"Started in {(time.perf_counter() - startup_begin) * 1000:.0f} ms")
 
     def closeEvent(self, event):
+        """
+        Stop every thread feeding the graphs first, deliver the batches they already queued to this window,
+        then drain the log writer, so no row logged before closing is lost
+        """
+        self.disconnectAll()
+        self.stopProfile()
+        self.stopReplay()
+        self.stopLogLoader()
+        self.stopCapture()
+        QCoreApplication.sendPostedEvents(self, QEvent.MetaCall)
+        self._graphManager.shutdown()
         event.accept()
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
+    if "--trace-frames" in sys.argv:
+        protocol_parser.set_trace_hook(lambda frame: print(bytes(frame).hex()))
 
     window = MainWindow()
+    app.aboutToQuit.connect(window._graphManager.shutdown)
+    if "--perf-stats-dump" in sys.argv:
+        window.startPerfStatsDump(sys.argv[sys.argv.index("--perf-stats-dump") + 1])
     window.show()
+    QTimer.singleShot(0, window.reportStartupTime)
 
     sys.exit(app.exec())
\ No newline at end of file
@@ -0,0 +1,113 @@
+import numpy as np
+from sample_buffer import SampleBuffer
+
+
+class NodeSeries:
+    """
+    Supply, output and target pressure history of one node, each one a SampleBuffer
+    """
+    __slots__ = ("supply", "output", "target")
+
+    def __init__(self, max_points: int = None, max_age_ms: float = None):
+        # Pressures arrive as 32 bit floats, timestamps need the 64 bits
+        self.supply = SampleBuffer(max_points, max_age_ms, value_dtype=np.float32)
+        self.output = SampleBuffer(max_points, max_age_ms, value_dtype=np.float32)
+        self.target = SampleBuffer(max_points, max_age_ms, value_dtype=np.float32)
+
+    def buffers(self) -> tuple:
+        return self.supply, self.output, self.target
+
+    def append(self, timestamp: float, supply_pressure: float, target_pressure: float, output_pressure: float) -> None:
+        """
+        Append one sample at timestamp (ms since epoch), negative values meaning no update
+        """
+        if supply_pressure >= 0.0:
+            self.supply.append(timestamp, supply_pressure)
+        if output_pressure >= 0.0:
+            self.output.append(timestamp, output_pressure)
+        if target_pressure >= 0.0:
+            self.target.append(timestamp, target_pressure)
+
+    def extend(self, timestamps: np.ndarray, supply_pressure: np.ndarray,
+               target_pressure: np.ndarray, output_pressure: np.ndarray) -> None:
+        """
+        Append many samples at once, e.g. when loading a log, negative values meaning no update
+        """
+        for buffer, values in ((self.supply, supply_pressure),
+                               (self.output, output_pressure),
+                               (self.target, target_pressure)):
+            mask = values >= 0.0
+            buffer.extend(timestamps[mask], values[mask])
+
+    def clear(self) -> None:
+        for buffer in self.buffers():
+            buffer.clear()
+
+    def set_retention(self, max_points: int = None, max_age_ms: float = None) -> None:
+        for buffer in self.buffers():
+            buffer.set_retention(max_points, max_age_ms)
+
+
+class NodeDataStore:
+    """
+    Central columnar store of the pressure history of every node, keyed on node id.
+    It is the only copy of the data: charts, logging and analysis read the arrays of
+    its SampleBuffers as views instead of digging into widgets.
+    """
+    def __init__(self, max_points: int = None, max_age_ms: float = None):
+        self._max_points = max_points
+        self._max_age_ms = max_age_ms
+        self._nodes = {}
+
+    def __contains__(self, node_id: int) -> bool:
+        return node_id in self._nodes
+
+    def __len__(self) -> int:
+        return len(self._nodes)
+
+    def node_ids(self) -> list[int]:
+        return list(self._nodes)
+
+    def add_node(self, node_id: int) -> NodeSeries:
+        """
+        Allocate the history of a node, or return it if it already exists
+        """
+        node = self._nodes.get(node_id)
+        if node is None:
+            node = self._nodes[node_id] = NodeSeries(self._max_points, self._max_age_ms)
+        return node
+
+    def node(self, node_id: int) -> NodeSeries:
+        """
+        History of a node, None if the node is unknown
+        """
+        return self._nodes.get(node_id)
+
+    def append(self, node_id: int, timestamp: float, supply_pressure: float, target_pressure: float, output_pressure: float) -> None:
+        """
+        Append one sample of a known node at timestamp (ms since epoch), negative values meaning no update
+        """
+        self._nodes[node_id].append(timestamp, supply_pressure, target_pressure, output_pressure)
+
+    def append_supply(self, node_ids, timestamp: float, supply_pressure: float) -> None:
+        """
+        Append one supply pressure reading, shared by all the given nodes
+        """
+        for node_id in node_ids:
+            self._nodes[node_id].supply.append(timestamp, supply_pressure)
+
+    def set_retention(self, max_points: int = None, max_age_ms: float = None) -> None:
+        """
+        Change the retention policy of every node, including nodes added later
+        """
+        self._max_points = max_points
+        self._max_age_ms = max_age_ms
+        for node in self._nodes.values():
+            node.set_retention(max_points, max_age_ms)
+
+    def clear(self) -> None:
+        """
+        Forget the history of every node, the nodes themselves are kept
+        """
+        for node in self._nodes.values():
+            node.clear()
@@ -0,0 +1,158 @@
+import bisect
+import json
+import time
+import protocol_parser
+
+# Instrumented code checks enabled before measuring anything, so the cost when disabled
+# is one attribute lookup per batch of frames (per frame in GraphManager)
+enabled = False
+
+# Bucket upper edges of the histograms, from 1 us to 10 s with 10 buckets per decade, plus an overflow bucket
+_bucket_edges = [1e-6 * 10 ** (i / 10) for i in range(71)]
+
+
+class Histogram:
+    """
+    Log scale histogram of durations in seconds, percentiles being estimated from the bucket edges
+    """
+    __slots__ = ("counts", "count", "total", "maximum")
+
+    def __init__(self):
+        self.counts = [0] * (len(_bucket_edges) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.maximum = 0.0
+
+    def record(self, seconds: float) -> None:
+        self.counts[bisect.bisect_left(_bucket_edges, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.maximum:
+            self.maximum = seconds
+
+    def percentile(self, fraction: float) -> float:
+        """
+        Upper edge of the bucket holding the given fraction of the samples, the maximum for the overflow bucket
+        """
+        if self.count == 0:
+            return 0.0
+        threshold = fraction * self.count
+        cumulated = 0
+        for index, count in enumerate(self.counts):
+            cumulated += count
+            if cumulated >= threshold:
+                return min(_bucket_edges[index], self.maximum) if index < len(_bucket_edges) else self.maximum
+        return self.maximum
+
+    def summary(self) -> dict:
+        return {"count": self.count,
+                "mean": self.total / self.count if self.count else 0.0,
+                "p50": self.percentile(0.50),
+                "p95": self.percentile(0.95),
+                "p99": self.percentile(0.99),
+                "max": self.maximum}
+
+
+class PerfStats:
+    """
+    Counters and stage histograms shared by the acquisition thread and the GUI thread.
+    Counters only go up, rates are computed by tick() over the interval between two calls.
+    Updates are not locked: a counter increment racing with another thread may rarely be lost,
+    which is acceptable for statistics and keeps recording cheap.
+
+    Counters: bytes_read, frames_received, bytes_dropped (garbage skipped by the decoder),
+    batches_emitted, batches_handled, frames_dispatched.
+    Drops are counted in bytes: a corrupted frame is resynchronized byte by byte, so the decoder can not tell
+    how many frames it lost. frames_dropped_estimate() gives the number of frames those bytes amount to.
+    Stages are durations in seconds measured with time.perf_counter:
+    decode (frame splitting and decoding in the reader thread, capture writes excluded), queue (receive to update_data),
+    dispatch (update_data), store (GraphManager appends), chart_refresh (level of detail and series replace),
+    chart_paint and receive_to_screen (receive to the end of the paint showing the newest sample),
+    dashboard_paint (paint of the sparkline grid of every node).
+    """
+    def __init__(self):
+        self.reset()
+
+    def reset(self) -> None:
+        self.counters = {}
+        self.stages = {}
+        self.rates = {}
+        self._started = time.time()
+        self._lastTick = time.perf_counter()
+        self._lastCounters = {}
+
+    def count(self, name: str, value: int = 1) -> None:
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def record(self, stage: str, seconds: float) -> None:
+        histogram = self.stages.get(stage)
+        if histogram is None:
+            histogram = self.stages[stage] = Histogram()
+        histogram.record(seconds)
+
+    def queue_depth(self) -> int:
+        """
+        Batches emitted by the acquisition thread and not handled by the GUI thread yet
+        Batches in flight when collection starts are only counted as handled, hence the clamp
+        """
+        return max(0, self.counters.get("batches_emitted", 0) - self.counters.get("batches_handled", 0))
+
+    def frames_dropped_estimate(self) -> int:
+        """
+        Frames the dropped bytes amount to, an estimate of the frames lost
+        """
+        return self.counters.get("bytes_dropped", 0) // protocol_parser.default_frame_length
+
+    def tick(self) -> None:
+        """
+        Update the per second rate of every counter since the previous tick
+        """
+        now = time.perf_counter()
+        elapsed = now - self._lastTick
+        if elapsed <= 0.0:
+            return
+        counters = dict(self.counters)
+        self.rates = {name: (value - self._lastCounters.get(name, 0)) / elapsed for name, value in counters.items()}
+        self._lastCounters = counters
+        self._lastTick = now
+
+    def snapshot(self) -> dict:
+        return {"time": time.time(),
+                "uptime_s": time.time() - self._started,
+                "counters": dict(self.counters),
+                "rates": dict(self.rates),
+                "queue_depth": self.queue_depth(),
+                "frames_dropped_estimate": self.frames_dropped_estimate(),
+                "stages": {name: histogram.summary() for name, histogram in list(self.stages.items())}}
+
+    def dump(self, path: str) -> None:
+        """
+        Append a snapshot as one JSON line
+        """
+        with open(path, 'a') as dump_file:
+            dump_file.write(json.dumps(self.snapshot()) + "\n")
+
+    def report(self) -> str:
+        """
+        Human readable table of the snapshot, durations in ms
+        """
+        snapshot = self.snapshot()
+        lines = [f"Queue depth: {snapshot['queue_depth']} batches",
+                 f"Dropped: {snapshot['counters'].get('bytes_dropped', 0)} bytes skipped by the decoder, "
+                 f"about {snapshot['frames_dropped_estimate']} frames"]
+        for name, value in sorted(snapshot["counters"].items()):
+            lines.append(f"{name:20s} {value:14d} {snapshot['rates'].get(name, 0.0):12.0f}/s")
+        lines.append("")
+        lines.append(f"{'stage (ms)':20s} {'count':>10s} {'mean':>9s} {'p50':>9s} {'p95':>9s} {'p99':>9s} {'max':>9s}")
+        for name, summary in sorted(snapshot["stages"].items()):
+            lines.append(f"{name:20s} {summary['count']:10d}" +
+                         "".join(f" {summary[key] * 1000:9.3f}" for key in ("mean", "p50", "p95", "p99", "max")))
+        return "\n".join(lines)
+
+
+stats = PerfStats()
+
+
+def set_enabled(enable: bool) -> None:
+    global enabled
+    enabled = enable
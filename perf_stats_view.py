@@ -0,0 +1,46 @@
+from PySide6.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QPlainTextEdit, QPushButton)
+from PySide6.QtGui import QFontDatabase
+from PySide6.QtCore import (Signal, Slot)
+import perf_stats
+
+
+class PerfStatsDialog(QDialog):
+    """
+    Panel showing the performance statistics, refreshed by the owner through refresh()
+    Statistics are collected while the panel is open or a periodic dump is running
+    """
+    statsDialogClosedSignal = Signal()
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Performance Statistics")
+        self.resize(700, 450)
+
+        self._text = QPlainTextEdit(self)
+        self._text.setReadOnly(True)
+        self._text.setFont(QFontDatabase.systemFont(QFontDatabase.FixedFont))
+
+        self._resetButton = QPushButton("Reset", self)
+        self._resetButton.clicked.connect(self.reset)
+
+        self._controlLayout = QHBoxLayout()
+        self._controlLayout.addStretch()
+        self._controlLayout.addWidget(self._resetButton)
+
+        self.layout = QVBoxLayout(self)
+        self.layout.addWidget(self._text)
+        self.layout.addLayout(self._controlLayout)
+
+    @Slot()
+    def refresh(self) -> None:
+        if self.isVisible():
+            self._text.setPlainText(perf_stats.stats.report())
+
+    @Slot()
+    def reset(self) -> None:
+        perf_stats.stats.reset()
+        self.refresh()
+
+    def hideEvent(self, event):
+        super().hideEvent(event)
+        self.statsDialogClosedSignal.emit()
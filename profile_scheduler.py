@@ -0,0 +1,224 @@
+"""
+Setpoint profiles: timed sequences of target pressures and valve commands run on several nodes.
+
+A profile is a JSON file mapping nodes to a list of steps, nodes being given as an id, a list ("1,3")
+or a range ("2-8"), prefixed with the port number for the controllers after the first one ("2:1-8"):
+
+    {
+      "name": "Endurance",
+      "nodes": {
+        "1-4": [
+          {"target": 2000, "hold_s": 5},
+          {"repeat": 100, "steps": [
+            {"ramp_to": 9000, "duration_s": 10, "interval_s": 0.1},
+            {"hold_s": 2},
+            {"target": 2000, "hold_s": 8}
+          ]}
+        ],
+        "5": [{"valve": "Max fill", "hold_s": 3}, {"valve": "Close all"}]
+      }
+    }
+
+A step sets a target and/or a valve status at its start, then waits hold_s. A ramp goes linearly from the
+previous target to ramp_to over duration_s, sending a target every interval_s. Every node starts at time 0.
+"""
+import json
+import time
+from PySide6.QtCore import (QThread, Signal)
+import protocol_parser
+import perf_stats
+from transmit_queue import Command
+from stoppable_thread import StoppableThreadMixin
+
+valve_statuses = ("Close all", "Slow empty", "Fast empty", "Max empty", "Slow fill", "Fast fill", "Max fill")
+default_ramp_interval_s = 0.1
+# The scheduler sleeps until this long before an event and busy waits the rest, bounding the jitter
+# to the time of a few perf_counter calls instead of the sleep granularity of the OS
+_spin_s = 0.002
+# Longest sleep, so stopping and progress reporting stay responsive
+_max_sleep_s = 0.05
+_progress_interval_s = 0.2
+
+
+class ProfileEvent:
+    """
+    Command of a profile: kind is "target" or "valve", time_s is relative to the start of the profile
+    """
+    __slots__ = ("time_s", "node_id", "kind", "value")
+
+    def __init__(self, time_s: float, node_id: int, kind: str, value: float):
+        self.time_s = time_s
+        self.node_id = node_id
+        self.kind = kind
+        self.value = value
+
+    def command(self) -> Command:
+        local_id = protocol_parser.split_node_id(self.node_id)[1]
+        if self.kind == "target":
+            return Command(protocol_parser.set_target_pressure(self.value, local_id), self.node_id,
+                           f"Profile target {self.value:.2f} mbar")
+        return Command(protocol_parser.set_valve(local_id, int(self.value)), self.node_id,
+                       f"Profile {valve_statuses[int(self.value)]}")
+
+
+class Profile:
+    """
+    Compiled profile: every event of every node sorted by time, and the duration of each node's sequence
+    """
+    def __init__(self, name: str, events: list, node_durations: dict):
+        self.name = name
+        self.events = sorted(events, key=lambda event: event.time_s)
+        self.node_durations = node_durations
+
+    @property
+    def duration_s(self) -> float:
+        return max(self.node_durations.values(), default=0.0)
+
+    @property
+    def node_ids(self) -> list:
+        return sorted(self.node_durations)
+
+
+def parse_node_ids(text: str) -> list[int]:
+    """
+    Global node ids of a node specification of a profile, e.g. "3", "1,3", "2-8" or "2:1-8" for port 2
+    """
+    port_slot = 0
+    text = str(text)
+    if ":" in text:
+        port, text = text.split(":")
+        port_slot = int(port) - 1
+        if port_slot < 0:
+            raise ValueError(f"Invalid port {port}")
+    return [protocol_parser.global_node_id(port_slot, node_id) for node_id in protocol_parser.parse_node_ids(text)]
+
+
+def valve_status(value) -> int:
+    if isinstance(value, str):
+        names = [name.lower() for name in valve_statuses]
+        if value.lower() not in names:
+            raise ValueError(f"Unknown valve status {value}")
+        return names.index(value.lower())
+    if not 0 <= int(value) < len(valve_statuses):
+        raise ValueError(f"Unknown valve status {value}")
+    return int(value)
+
+
+def compile_steps(node_id: int, steps: list, events: list, time_s: float = 0.0, target: float = 0.0) -> tuple[float, float]:
+    """
+    Append the events of steps starting at time_s to events.
+    Returns the time and the target pressure at the end of the steps, a ramp starting from the previous target.
+    """
+    for step in steps:
+        if "repeat" in step:
+            for _ in range(int(step["repeat"])):
+                time_s, target = compile_steps(node_id, step["steps"], events, time_s, target)
+            continue
+        if "ramp_to" in step:
+            duration_s = float(step["duration_s"])
+            interval_s = float(step.get("interval_s", default_ramp_interval_s))
+            if duration_s <= 0.0 or interval_s <= 0.0:
+                raise ValueError("A ramp needs a positive duration_s and interval_s")
+            start_target, end_target = target, float(step["ramp_to"])
+            count = max(1, round(duration_s / interval_s))
+            for i in range(1, count + 1):
+                target = start_target + (end_target - start_target) * i / count
+                events.append(ProfileEvent(time_s + duration_s * i / count, node_id, "target", target))
+            time_s += duration_s
+        if "target" in step:
+            target = float(step["target"])
+            events.append(ProfileEvent(time_s, node_id, "target", target))
+        if "valve" in step:
+            events.append(ProfileEvent(time_s, node_id, "valve", valve_status(step["valve"])))
+        time_s += float(step.get("hold_s", 0.0))
+    return time_s, target
+
+
+def load_profile(path: str) -> Profile:
+    """
+    Read and compile a profile file, raising ValueError for an invalid profile
+    """
+    with open(path) as profile_file:
+        try:
+            description = json.load(profile_file)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Invalid profile file: {e}")
+    events = []
+    node_durations = {}
+    try:
+        for node_ids, steps in description["nodes"].items():
+            for node_id in parse_node_ids(node_ids):
+                node_durations[node_id], _ = compile_steps(node_id, steps, events)
+    except (KeyError, TypeError, AttributeError) as e:
+        raise ValueError(f"Invalid profile: {e}")
+    return Profile(description.get("name", path), events, node_durations)
+
+
+class ProfileRunner(StoppableThreadMixin, QThread):
+    """
+    Thread running a profile off the GUI thread.
+    Commands are handed to send, which queues them on the transmit queue of their port, at their scheduled time, the events due together
+    being sent together. Timing uses perf_counter: sleep until shortly before an event, then busy wait.
+    The lateness of every event is recorded as max_jitter_s and in the "profile_jitter" statistics.
+    setpointsSentSignal reports the events sent with their scheduled time in ms since epoch,
+    so the commanded targets can be stored in the target series.
+    """
+    setpointsSentSignal = Signal(list)
+    progressSignal = Signal(float)
+    profileFinishedSignal = Signal()
+
+    def __init__(self, profile: Profile, send, parent=None):
+        super().__init__(parent)
+        self._profile = profile
+        self._send = send
+        self._running = False
+        self.max_jitter_s = 0.0
+
+    @property
+    def profile(self) -> Profile:
+        return self._profile
+
+    def wait_until(self, due: float, start: float) -> bool:
+        """
+        Wait until the perf_counter time due, reporting the progress meanwhile. False when stopped.
+        """
+        while self._running:
+            now = time.perf_counter()
+            remaining = due - now
+            if remaining <= 0.0:
+                return True
+            if now - self._lastProgress >= _progress_interval_s:
+                self._lastProgress = now
+                self.progressSignal.emit(now - start)
+            if remaining > _spin_s:
+                time.sleep(min(remaining - _spin_s, _max_sleep_s))
+        return False
+
+    def run(self) -> None:
+        events = self._profile.events
+        start = time.perf_counter()
+        start_epoch_ms = time.time() * 1000
+        self._lastProgress = start
+        index = 0
+        while index < len(events) and self.wait_until(start + events[index].time_s, start):
+            time_s = events[index].time_s
+            jitter_s = time.perf_counter() - start - time_s
+            due = []
+            while index < len(events) and events[index].time_s <= time_s:
+                due.append(events[index])
+                index += 1
+            for event in due:
+                self._send(event.command())
+            self.max_jitter_s = max(self.max_jitter_s, jitter_s)
+            if perf_stats.enabled:
+                perf_stats.stats.record("profile_jitter", jitter_s)
+            timestamp_ms = start_epoch_ms + time_s * 1000
+            self.setpointsSentSignal.emit([(event.node_id, timestamp_ms, event.kind, event.value) for event in due])
+        if self._running and self.wait_until(start + self._profile.duration_s, start):
+            self.progressSignal.emit(self._profile.duration_s)
+        self._running = False
+        self.profileFinishedSignal.emit()
+
+    def stop(self) -> None:
+        self._running = False
+        self.wait()
@@ -1,7 +1,61 @@
+import math
+import re
 import struct
+from enum import IntEnum
+import numpy as np
 
 default_frame_length = 8
 
+# Node ids are namespaced per serial port so several controllers can be monitored at once:
+# global id = port slot * nodes_per_port + id on the controller, the id 0 of a controller
+# standing for the controller itself (supply and atmosphere pressure)
+nodes_per_port = 256
+
+def global_node_id(port_slot: int, node_id: int) -> int:
+    return port_slot * nodes_per_port + node_id
+
+def split_node_id(global_id: int) -> tuple[int, int]:
+    """
+    Port slot and id on the controller of a global node id
+    """
+    return divmod(global_id, nodes_per_port)
+
+def node_label(global_id: int) -> str:
+    port_slot, node_id = split_node_id(global_id)
+    return f"Node {node_id}" if port_slot == 0 else f"Port {port_slot + 1} Node {node_id}"
+
+def parse_node_label(text: str) -> int:
+    """
+    Global id of a node given as its id on the first port or as its label, e.g. "3", "Node 3" or "Port 2 Node 3"
+    Raises ValueError for a text which is not a node
+    """
+    match = re.fullmatch(r"(?:Port\s*(\d+)\s+)?(?:Node\s*)?(\d+)", text.strip(), re.IGNORECASE)
+    if match is None:
+        raise ValueError(f"Invalid node {text}")
+    port_slot = int(match.group(1)) - 1 if match.group(1) else 0
+    node_id = int(match.group(2))
+    if port_slot < 0 or not 0 < node_id < nodes_per_port:
+        raise ValueError(f"Invalid node {text}")
+    return global_node_id(port_slot, node_id)
+
+def parse_node_ids(text: str) -> list[int]:
+    """
+    Node ids on a controller given as an id, a list and/or ranges, e.g. "3", "1,3" or "1,4-8"
+    """
+    node_ids = []
+    for part in str(text).split(","):
+        if "-" in part:
+            first, last = part.split("-")
+            node_ids += range(int(first), int(last) + 1)
+        else:
+            node_ids.append(int(part))
+    if any(not 0 < node_id < nodes_per_port for node_id in node_ids):
+        raise ValueError(f"Invalid nodes {text}")
+    return node_ids
+
+# First byte of every frame the controller sends to the host
+frame_headers = (0x03, 0x07, 0x08, 0x09, 0x10)
+
 def set_target_pressure(target_pressure : float, node_id : int) -> bytes:
     command = [0x6,0x05,0x07, node_id,]
     return bytes(command) + struct.pack('<f', target_pressure)
@@ -18,24 +72,230 @@ def sending_type_command(node_id: int , sending_type:int,cycle:int) -> bytes:
     command = [0x6,node_id,0xD,sending_type,(cycle >> 8) & 0xFF,cycle & 0xFF,0x00,0x00]
     return bytes(command)
 
-def get_data_from_frame(frame: bytes) -> tuple:
-    # Atmosphere pressure sent to host
-    print(frame.hex())
-    if frame[0] == 0x08:
-        return "AtmospherePressure", struct.unpack('<f', frame[1:5])[0]
-    elif frame[0] == 0x09:
-        return "SupplyPressure", struct.unpack('<f', frame[1:5])[0]
-    elif frame[0] == 0x10:
-        return "NodePressure", frame[1], struct.unpack('<f', frame[2:6])[0]
-    elif frame[0] == 0x03:
-        return "NodePressureInDevelopment", frame[1], struct.unpack('<f', frame[2:6])[0]
-    elif frame[0] == 0x07:
-        if frame[2] == 0x09:
-            return "ManualModeEnter",frame[3]
-        if frame[2] == 0x0B:
-            return "ManualModeExit",frame[3]
-        if frame[2] == 0x0F:
-            return "ValveFeedback",frame[3]
-    return "UnknownInformation",0,0
-    
-    
+class FrameKind(IntEnum):
+    """
+    Kind of information carried by a frame received from the controller
+    """
+    UNKNOWN = 0
+    ATMOSPHERE_PRESSURE = 1
+    SUPPLY_PRESSURE = 2
+    NODE_PRESSURE = 3
+    NODE_PRESSURE_IN_DEVELOPMENT = 4
+    MANUAL_MODE_ENTER = 5
+    MANUAL_MODE_EXIT = 6
+    VALVE_FEEDBACK = 7
+
+
+class FrameRecord:
+    """
+    Decoded frame.
+    node_id is 0 for frames that are not bound to a node,
+    value is the pressure for pressure frames and the status byte for feedback frames.
+    """
+    __slots__ = ("kind", "node_id", "value")
+
+    def __init__(self, kind: FrameKind, node_id: int = 0, value: float = 0.0):
+        self.kind = kind
+        self.node_id = node_id
+        self.value = value
+
+    def __repr__(self) -> str:
+        return f"FrameRecord({self.kind.name}, node_id={self.node_id}, value={self.value})"
+
+
+# Precompiled layouts of the 8 byte frames: header + float, header + node id + float,
+# and header + node id + echoed command + status
+_host_pressure_frame = struct.Struct('<Bf3x')
+_node_pressure_frame = struct.Struct('<BBf2x')
+_feedback_frame = struct.Struct('<BBBB4x')
+
+_feedback_kinds = {0x09: FrameKind.MANUAL_MODE_ENTER,
+                   0x0B: FrameKind.MANUAL_MODE_EXIT,
+                   0x0F: FrameKind.VALVE_FEEDBACK}
+
+# Pressure frames keyed on the header byte: kind, precompiled unpacker and whether the frame carries a node id
+_pressure_frame_layouts = {0x08: (FrameKind.ATMOSPHERE_PRESSURE, _host_pressure_frame.unpack_from, False),
+                           0x09: (FrameKind.SUPPLY_PRESSURE, _host_pressure_frame.unpack_from, False),
+                           0x10: (FrameKind.NODE_PRESSURE, _node_pressure_frame.unpack_from, True),
+                           0x03: (FrameKind.NODE_PRESSURE_IN_DEVELOPMENT, _node_pressure_frame.unpack_from, True)}
+
+def atmosphere_pressure_frame(value: float) -> bytes:
+    """
+    Encode a frame as sent by the controller, used to replay or simulate a session
+    """
+    return _host_pressure_frame.pack(0x08, value)
+
+def supply_pressure_frame(value: float) -> bytes:
+    return _host_pressure_frame.pack(0x09, value)
+
+def node_pressure_frame(node_id: int, value: float, in_development: bool = False) -> bytes:
+    return _node_pressure_frame.pack(0x03 if in_development else 0x10, node_id, value)
+
+def feedback_frame(node_id: int, command: int, status: int) -> bytes:
+    """
+    Answer of the controller to a command: the command byte is echoed along with a status, 0 meaning success
+    """
+    return _feedback_frame.pack(0x07, node_id, command, status)
+
+def expected_feedback(command: bytes):
+    """
+    Kind of the feedback frame the controller answers a command with, None for commands without answer
+    """
+    if len(command) != default_frame_length or command[0] != 0x06:
+        return None
+    if command[1] == 0x05 and command[2] == 0x07:
+        return None
+    return _feedback_kinds.get(command[2])
+
+# Optional callable receiving every decoded raw frame, for debugging only
+_trace_hook = None
+
+def set_trace_hook(hook) -> None:
+    """
+    Install a callable that receives every frame passed to get_data_from_frame,
+    e.g. set_trace_hook(lambda frame: print(frame.hex())). None disables tracing.
+    """
+    global _trace_hook
+    _trace_hook = hook
+
+def get_data_from_frame(frame) -> FrameRecord:
+    """
+    Decode one frame, given as bytes or memoryview, into a FrameRecord
+    """
+    if _trace_hook is not None:
+        _trace_hook(frame)
+    layout = _pressure_frame_layouts.get(frame[0])
+    if layout is not None:
+        kind, unpack_from, node_frame = layout
+        if node_frame:
+            _, node_id, value = unpack_from(frame)
+            return FrameRecord(kind, node_id, value)
+        return FrameRecord(kind, 0, unpack_from(frame)[1])
+    if frame[0] == 0x07:
+        _, node_id, command, status = _feedback_frame.unpack_from(frame)
+        kind = _feedback_kinds.get(command)
+        if kind is not None:
+            return FrameRecord(kind, node_id, status)
+    return FrameRecord(FrameKind.UNKNOWN)
+
+
+# Row layout returned by decode_frames.
+# value holds the pressure for pressure frames and the status byte for feedback frames,
+# command is only meaningful for feedback frames (0x07) and timestamp is in ms since epoch.
+frame_dtype = np.dtype([('frame_type', np.uint8),
+                        ('node_id', np.uint8),
+                        ('command', np.uint8),
+                        ('value', np.float32),
+                        ('timestamp', np.float64)])
+
+def decode_frames(buffer, timestamps=0.0) -> np.ndarray:
+    """
+    Decode a contiguous buffer of N frames at once into a structured array of frame_dtype.
+    All frames are viewed as an N x frame length byte matrix and every field is filled
+    through masked vector assignments, so there is no Python work per frame.
+    timestamps can be a single value shared by all frames or one value per frame.
+    Trailing bytes that do not form a complete frame are ignored.
+    """
+    raw = np.frombuffer(buffer, dtype=np.uint8)
+    count = len(raw) // default_frame_length
+    frames = raw[:count * default_frame_length].reshape(count, default_frame_length)
+    header = frames[:, 0]
+
+    result = np.zeros(count, dtype=frame_dtype)
+    result['frame_type'] = header
+    result['timestamp'] = timestamps
+
+    # Atmosphere and supply frames carry their float at byte 1, node frames at byte 2
+    host_mask = (header == 0x08) | (header == 0x09)
+    node_mask = (header == 0x10) | (header == 0x03)
+    feedback_mask = header == 0x07
+    host_values = np.ascontiguousarray(frames[host_mask, 1:5]).view('<f4')[:, 0]
+    node_values = np.ascontiguousarray(frames[node_mask, 2:6]).view('<f4')[:, 0]
+
+    result['value'][host_mask] = host_values
+    result['value'][node_mask] = node_values
+    result['node_id'][node_mask] = frames[node_mask, 1]
+    result['node_id'][feedback_mask] = frames[feedback_mask, 1]
+    result['command'][feedback_mask] = frames[feedback_mask, 2]
+    result['value'][feedback_mask] = frames[feedback_mask, 3]
+    return result
+
+def is_valid_frame(frame: bytes) -> bool:
+    """
+    Plausibility check of a frame candidate, used to find frame boundaries again after a glitch.
+    The header must be known and the payload must make sense for that header:
+    pressure values must be finite floats, node pressure frames need a non zero node id
+    and feedback frames must echo a command we know.
+    """
+    header = frame[0]
+    if header == 0x08 or header == 0x09:
+        return math.isfinite(_host_pressure_frame.unpack_from(frame)[1])
+    if header == 0x10 or header == 0x03:
+        return frame[1] != 0 and math.isfinite(_node_pressure_frame.unpack_from(frame)[2])
+    if header == 0x07:
+        return frame[2] in (0x09, 0x0B, 0x0F)
+    return False
+
+
+class FrameDecoder:
+    """
+    Stateful incremental decoder for the serial byte stream.
+    It accepts chunks of any size and returns every complete frame found so far,
+    keeping incomplete trailing bytes for the next call.
+    When a frame fails the validity check the decoder drops bytes until the next known header
+    whose frame is valid and is itself followed by a known header, so a single lost or extra
+    byte only costs the frames around it instead of the rest of the session.
+    """
+    def __init__(self, frame_length: int = default_frame_length):
+        self._frame_length = frame_length
+        self._buffer = bytearray()
+        self._synchronized = True
+        self.dropped_bytes = 0
+
+    def reset(self) -> None:
+        """
+        Forget buffered bytes, e.g. after reconnecting
+        """
+        self._buffer.clear()
+        self._synchronized = True
+
+    def _next_header(self, start: int) -> int:
+        """
+        Position of the first known header byte at or after start, or the buffer length if there is none
+        """
+        positions = [self._buffer.find(header, start) for header in frame_headers]
+        positions = [position for position in positions if position >= 0]
+        return min(positions) if positions else len(self._buffer)
+
+    def feed(self, chunk: bytes) -> list[bytes]:
+        """
+        Append a chunk of received bytes and return all complete frames it completes
+        """
+        buffer = self._buffer
+        buffer += chunk
+        frame_length = self._frame_length
+        frames = []
+        position = 0
+        # Candidates are checked on a memoryview and only accepted frames are copied out
+        with memoryview(buffer) as view:
+            while len(buffer) - position >= frame_length:
+                end = position + frame_length
+                if is_valid_frame(view[position:end]):
+                    if self._synchronized:
+                        frames.append(view[position:end].tobytes())
+                        position = end
+                        continue
+                    # While resynchronizing, only trust a candidate followed by another header
+                    if end == len(buffer):
+                        break
+                    if buffer[end] in frame_headers:
+                        frames.append(view[position:end].tobytes())
+                        position = end
+                        self._synchronized = True
+                        continue
+                self._synchronized = False
+                next_position = self._next_header(position + 1)
+                self.dropped_bytes += next_position - position
+                position = next_position
+        del buffer[:position]
+        return frames
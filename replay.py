@@ -0,0 +1,329 @@
+import os
+import re
+import threading
+import time
+import numpy as np
+from PySide6.QtWidgets import (QDialog, QGridLayout, QPushButton, QComboBox, QLabel, QSlider)
+from PySide6.QtCore import (Qt, QThread, QDateTime, Signal, Slot)
+import protocol_parser
+import capture
+import perf_stats
+from serial_reader import decode_batch
+from stoppable_thread import StoppableThreadMixin
+
+# Replay speeds offered to the user, None meaning as fast as possible
+replay_speeds = {"1x": 1.0, "2x": 2.0, "5x": 5.0, "10x": 10.0, "100x": 100.0, "Max": None}
+
+
+def load_capture(path: str) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Frames of a raw capture with their receive timestamps in ms since epoch
+    """
+    _, records = capture.open_capture(path)
+    return records['timestamp_ns'] / 1e6, records['frame']
+
+
+def csv_log_node(path: str) -> tuple[int, int]:
+    """
+    Port slot and id on the controller of the node of a CSV pressure log, taken from its file name
+    ("... Node 3.csv" or "... Port 2 Node 3.csv"), node 1 of the first port when the name has none
+    """
+    match = re.search(r"(?:Port (\d+) )?Node (\d+)", os.path.basename(path))
+    if match is None:
+        return 0, 1
+    port_slot = int(match.group(1)) - 1 if match.group(1) else 0
+    return port_slot, int(match.group(2))
+
+
+def capture_port_slot(path: str, header: dict) -> int:
+    """
+    Port slot of the controller recorded in a raw capture: the one of its header, or for captures written
+    before it was stored, the one of a file name suffixed with _port<N> like the captures of the other ports
+    """
+    if header["port_slot"]:
+        return header["port_slot"]
+    match = re.search(r"_port(\d+)$", os.path.splitext(os.path.basename(path))[0])
+    return int(match.group(1)) - 1 if match and int(match.group(1)) > 0 else 0
+
+
+def load_csv_log(path: str, node_id: int = None) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Frames the controller would have sent for a CSV pressure log: supply pressure and node pressure frames.
+    The node, an id on the controller, is taken from the file name (see csv_log_node) unless given.
+    Target pressures are set by the host and have no frame of their own, so they are not replayed.
+    """
+    from log_loader import iter_log_chunks
+    if node_id is None:
+        node_id = csv_log_node(path)[1]
+    chunks = [chunk[:3] for chunk in iter_log_chunks(path)]
+    if not chunks:
+        return np.empty(0), np.empty((0, protocol_parser.default_frame_length), dtype=np.uint8)
+    timestamps, supply, output = (np.concatenate(column) for column in zip(*chunks))
+
+    supply_mask = supply >= 0.0
+    output_mask = output >= 0.0
+    count = int(supply_mask.sum() + output_mask.sum())
+    frames = np.zeros((count, protocol_parser.default_frame_length), dtype=np.uint8)
+    frame_timestamps = np.concatenate((timestamps[supply_mask], timestamps[output_mask]))
+    supply_count = int(supply_mask.sum())
+    # Same layouts as protocol_parser.supply_pressure_frame and node_pressure_frame, built for all rows at once
+    frames[:supply_count, 0] = 0x09
+    frames[:supply_count, 1:5] = supply[supply_mask].astype('<f4').view(np.uint8).reshape(-1, 4)
+    frames[supply_count:, 0] = 0x10
+    frames[supply_count:, 1] = node_id
+    frames[supply_count:, 2:6] = output[output_mask].astype('<f4').view(np.uint8).reshape(-1, 4)
+    order = np.argsort(frame_timestamps, kind='stable')
+    return frame_timestamps[order], frames[order]
+
+
+def open_session(path: str, parent=None) -> "ReplaySource":
+    """
+    Replay source of a recorded session, a raw capture or a CSV log
+    """
+    try:
+        header = capture.read_header(path)
+    except ValueError:
+        port_slot, node_id = csv_log_node(path)
+        return ReplaySource(*load_csv_log(path, node_id), parent=parent,
+                            node_offset=protocol_parser.global_node_id(port_slot, 0))
+    return ReplaySource(*load_capture(path), parent=parent,
+                        node_offset=protocol_parser.global_node_id(capture_port_slot(path, header), 0))
+
+
+class ReplaySource(StoppableThreadMixin, QThread):
+    """
+    Replay of a recorded session.
+    It emits the same signals as SerialReader, so the frames go through the same path as live data:
+    protocol_parser, MainWindow.update_data, GraphManager and the graph dialogs.
+    Frames received together are emitted together with their recorded timestamp, at the chosen speed
+    or as fast as possible, and at most max_pending batches wait for the GUI thread, so replaying never
+    floods the event queue. Frames are grouped by ms at 1x; faster, they are grouped over speed ms
+    (max_speed_quantum_ms as fast as possible) so the number of batches per second stays bounded.
+    Seeking emits seekedSignal before the first frame of the new position, so the receiver can drop the
+    data replayed so far and keep timestamps in order.
+    The thread keeps running once the end is reached, so the session can be sought and replayed again.
+    node_offset turns the node ids of the recorded frames into global node ids, like for SerialReader.
+    """
+    framesReceivedSignal = Signal(QDateTime, list, list)
+    serialErrorSignal = Signal(str)
+    positionChangedSignal = Signal(float)
+    seekedSignal = Signal()
+    replayFinishedSignal = Signal()
+
+    max_pending = 32
+    max_batch_frames = 4096
+    position_interval_s = 0.1
+    max_speed_quantum_ms = 1000
+
+    def __init__(self, timestamps: np.ndarray, frames: np.ndarray, parent=None, node_offset: int = 0):
+        super().__init__(parent)
+        self._nodeOffset = node_offset
+        self._timestamps = np.asarray(timestamps, dtype=np.float64)
+        self._frames = np.ascontiguousarray(frames, dtype=np.uint8)
+        self._lock = threading.Lock()
+        self._running = False
+        self._paused = True
+        self._speed = 1.0
+        self._seekRequest = None
+        self._anchorChanged = True
+        self._pending = 0
+        self.framesReceivedSignal.connect(self.batchConsumed)
+
+    def __len__(self) -> int:
+        return len(self._timestamps)
+
+    @property
+    def start_ms(self) -> float:
+        return float(self._timestamps[0]) if len(self._timestamps) else 0.0
+
+    @property
+    def end_ms(self) -> float:
+        return float(self._timestamps[-1]) if len(self._timestamps) else 0.0
+
+    def set_speed(self, speed: float) -> None:
+        """
+        Replay speed factor, None meaning as fast as possible
+        """
+        with self._lock:
+            self._speed = speed
+            self._anchorChanged = True
+
+    def set_paused(self, paused: bool) -> None:
+        with self._lock:
+            self._paused = paused
+            self._anchorChanged = True
+
+    def seek(self, timestamp_ms: float) -> None:
+        with self._lock:
+            self._seekRequest = timestamp_ms
+            self._anchorChanged = True
+
+    @Slot()
+    def batchConsumed(self) -> None:
+        """
+        Called in the GUI thread for every batch delivered, to bound the number of batches waiting there
+        """
+        with self._lock:
+            self._pending -= 1
+
+    def run(self) -> None:
+        """
+        Replay loop.
+        The replay clock is anchored on a recorded timestamp and the wall clock, every change of speed,
+        pause or position anchors it again. Every loop emits the frames the replay clock went past.
+        """
+        timestamps = self._timestamps
+        count = len(timestamps)
+        index = 0
+        anchor_ms = self.start_ms
+        anchor_wall = time.perf_counter()
+        last_position = 0.0
+        finished = False
+        while self._running:
+            with self._lock:
+                seek_request, self._seekRequest = self._seekRequest, None
+                anchor_changed, self._anchorChanged = self._anchorChanged, False
+                paused = self._paused
+                speed = self._speed
+                pending = self._pending
+            if anchor_changed and not paused and index >= count and seek_request is None:
+                # Playing again once the end is reached starts over
+                seek_request = self.start_ms
+            if seek_request is not None:
+                index = int(np.searchsorted(timestamps, seek_request, side='left'))
+                finished = False
+                self.seekedSignal.emit()
+                self.positionChangedSignal.emit(seek_request)
+            if anchor_changed or seek_request is not None:
+                anchor_ms = seek_request if seek_request is not None else (
+                    float(timestamps[index]) if index < count else self.end_ms)
+                anchor_wall = time.perf_counter()
+            if paused or index >= count or pending >= self.max_pending:
+                if index >= count and not finished:
+                    finished = True
+                    self.positionChangedSignal.emit(self.end_ms)
+                    self.replayFinishedSignal.emit()
+                time.sleep(0.005)
+                continue
+
+            if speed is None:
+                end = min(count, index + self.max_batch_frames)
+            else:
+                replay_ms = anchor_ms + (time.perf_counter() - anchor_wall) * 1000 * speed
+                end = min(index + self.max_batch_frames,
+                          int(np.searchsorted(timestamps, replay_ms, side='right')))
+                if end <= index:
+                    wait_s = (timestamps[index] - replay_ms) / 1000 / speed
+                    time.sleep(min(max(wait_s, 0.0), 0.01))
+                    continue
+            quantum_ms = self.max_speed_quantum_ms if speed is None else max(1, int(speed))
+            index = self.emit_frames(index, end, quantum_ms)
+
+            now = time.perf_counter()
+            if now - last_position >= self.position_interval_s:
+                last_position = now
+                self.positionChangedSignal.emit(float(timestamps[index - 1]))
+        self._running = False
+
+    def emit_frames(self, begin: int, end: int, quantum_ms: int = 1) -> int:
+        """
+        Emit the frames [begin, end) grouped by recorded timestamp over quantum_ms, a batch getting the
+        timestamp of its first frame. It stops early when max_pending batches wait for the GUI thread.
+        Returns the index of the first frame not emitted.
+        """
+        timestamps = self._timestamps[begin:end].astype(np.int64)
+        bounds = np.flatnonzero(np.diff(timestamps // quantum_ms)) + 1
+        starts = np.concatenate(([0], bounds))
+        stops = np.concatenate((bounds, [end - begin]))
+        frame_length = self._frames.shape[1]
+        data = self._frames[begin:end].tobytes()
+        for start, stop in zip(starts.tolist(), stops.tolist()):
+            with self._lock:
+                if self._pending >= self.max_pending:
+                    return begin + start
+                self._pending += 1
+            frames = [data[offset:offset + frame_length]
+                      for offset in range(start * frame_length, stop * frame_length, frame_length)]
+            now = QDateTime.fromMSecsSinceEpoch(int(timestamps[start]))
+            if perf_stats.enabled:
+                perf_stats.stats.count("frames_received", len(frames))
+                perf_stats.stats.count("batches_emitted")
+            self.framesReceivedSignal.emit(now, *decode_batch(now, frames, self._nodeOffset))
+        return end
+
+    def stop(self) -> None:
+        self._running = False
+        self.wait()
+
+
+class ReplayDialog(QDialog):
+    """
+    Controls of a replay: play/pause, speed and a position slider to seek
+    """
+    replayClosedSignal = Signal()
+    slider_steps = 1000
+
+    def __init__(self, replay_source: ReplaySource, title: str, parent=None):
+        super().__init__(parent)
+        self._replaySource = replay_source
+        self.setWindowTitle(f"Replay {title}")
+        self.resize(500, 100)
+
+        self._playButton = QPushButton("▶ Play", self)
+        self._playButton.clicked.connect(self.onPlayPause)
+
+        self._speedCombobox = QComboBox(self)
+        self._speedCombobox.addItems(list(replay_speeds))
+        self._speedCombobox.currentTextChanged.connect(self.onSpeedChanged)
+
+        self._positionSlider = QSlider(Qt.Horizontal, self)
+        self._positionSlider.setRange(0, self.slider_steps)
+        self._positionSlider.sliderReleased.connect(self.onSeek)
+
+        self._positionLabel = QLabel(self)
+        self._durationLabel = QLabel(QDateTime.fromMSecsSinceEpoch(int(replay_source.end_ms)).toString("yyyy-MM-dd hh:mm:ss"), self)
+
+        self.layout = QGridLayout(self)
+        self.layout.addWidget(self._playButton, 0, 0)
+        self.layout.addWidget(self._speedCombobox, 0, 1)
+        self.layout.addWidget(self._positionLabel, 0, 2)
+        self.layout.addWidget(self._durationLabel, 0, 3)
+        self.layout.addWidget(self._positionSlider, 1, 0, 1, 4)
+
+        replay_source.positionChangedSignal.connect(self.onPositionChanged)
+        replay_source.replayFinishedSignal.connect(self.onReplayFinished)
+        self.onPositionChanged(replay_source.start_ms)
+
+    @Slot()
+    def onPlayPause(self):
+        playing = self._playButton.text() == "▶ Play"
+        self._replaySource.set_paused(not playing)
+        self._playButton.setText("⏸ Pause" if playing else "▶ Play")
+
+    @Slot(str)
+    def onSpeedChanged(self, speed: str):
+        self._replaySource.set_speed(replay_speeds[speed])
+
+    @Slot()
+    def onSeek(self):
+        source = self._replaySource
+        span = source.end_ms - source.start_ms
+        source.seek(source.start_ms + span * self._positionSlider.value() / self.slider_steps)
+
+    @Slot(float)
+    def onPositionChanged(self, timestamp_ms: float):
+        self._positionLabel.setText(QDateTime.fromMSecsSinceEpoch(int(timestamp_ms)).toString("yyyy-MM-dd hh:mm:ss.zzz"))
+        if not self._positionSlider.isSliderDown():
+            source = self._replaySource
+            span = source.end_ms - source.start_ms
+            if span > 0:
+                self._positionSlider.setValue(int(self.slider_steps * (timestamp_ms - source.start_ms) / span))
+
+    @Slot()
+    def onReplayFinished(self):
+        self._replaySource.set_paused(True)
+        self._playButton.setText("▶ Play")
+
+    def closeEvent(self, event):
+        self.replayClosedSignal.emit()
+        super().closeEvent(event)
@@ -0,0 +1,168 @@
+import numpy as np
+
+# Retention choices offered to the user: label -> (maximum number of points, maximum age in ms)
+retention_policies = {"Keep 10 min": (None, 10 * 60 * 1000),
+                      "Keep 1 h": (None, 60 * 60 * 1000),
+                      "Keep 8 h": (None, 8 * 60 * 60 * 1000),
+                      "Keep 100k points": (100_000, None),
+                      "Keep all": (None, None)}
+
+
+class SampleBuffer:
+    """
+    Time ordered (timestamp, value) samples stored in contiguous NumPy arrays,
+    with an optional retention policy bounding either the number of points, the age of
+    the oldest point relative to the newest one, or both.
+
+    The samples live in a sliding window [head, tail) over preallocated storage.
+    Evicting only moves head forward and the live window is copied back to the front
+    when the storage runs out, so eviction is done in bulk and appends stay amortized O(1),
+    like a ring buffer whose content is always contiguous.
+    To avoid evicting one point per append, the limits may be exceeded by 10 % before
+    the buffer is trimmed back to them.
+    version changes on every modification, so readers can poll it to know when to refresh.
+    """
+    def __init__(self, max_points: int = None, max_age_ms: float = None, capacity: int = 1024,
+                 value_dtype=np.float64):
+        self._timestamps = np.empty(capacity, dtype=np.float64)
+        self._values = np.empty(capacity, dtype=value_dtype)
+        self._head = 0
+        self._tail = 0
+        # Number of samples removed from the front since creation
+        self._dropped = 0
+        self.version = 0
+        self._max_points = None
+        self._max_age_ms = None
+        self.set_retention(max_points, max_age_ms)
+
+    def __len__(self) -> int:
+        return self._tail - self._head
+
+    @property
+    def start_index(self) -> int:
+        """
+        Absolute index of the oldest retained sample, i.e. how many samples were appended before it
+        """
+        return self._dropped
+
+    @property
+    def timestamps(self) -> np.ndarray:
+        """
+        View of the retained timestamps (ms since epoch), oldest first
+        """
+        return self._timestamps[self._head:self._tail]
+
+    @property
+    def values(self) -> np.ndarray:
+        """
+        View of the retained values, aligned with timestamps
+        """
+        return self._values[self._head:self._tail]
+
+    def nearest_index(self, timestamp: float) -> int:
+        """
+        Index, relative to timestamps, of the sample closest in time to timestamp.
+        Timestamps are sorted, so this is a binary search. The buffer must not be empty.
+        """
+        timestamps = self.timestamps
+        index = int(np.searchsorted(timestamps, timestamp))
+        if index == len(timestamps):
+            return index - 1
+        if index > 0 and timestamp - timestamps[index - 1] <= timestamps[index] - timestamp:
+            return index - 1
+        return index
+
+    def set_retention(self, max_points: int = None, max_age_ms: float = None) -> int:
+        """
+        Change the retention policy, None meaning unbounded.
+        The buffer is trimmed to the new limits right away, the number of evicted samples is returned.
+        """
+        self._max_points = max_points
+        self._max_age_ms = max_age_ms
+        self.version += 1
+        return self._trim(exact=True)
+
+    def clear(self) -> None:
+        self._dropped += self._tail - self._head
+        self._head = 0
+        self._tail = 0
+        self.version += 1
+
+    def discard(self, count: int) -> None:
+        """
+        Remove the count oldest samples
+        """
+        count = min(count, self._tail - self._head)
+        self._head += count
+        self._dropped += count
+        self.version += 1
+
+    def append(self, timestamp: float, value: float) -> int:
+        """
+        Append one sample, timestamps must not go backwards.
+        Returns the number of samples evicted from the front by the retention policy.
+        """
+        if self._tail == len(self._timestamps):
+            self._make_room(1)
+        self._timestamps[self._tail] = timestamp
+        self._values[self._tail] = value
+        self._tail += 1
+        self.version += 1
+        return self._trim()
+
+    def extend(self, timestamps, values) -> int:
+        """
+        Append many samples at once, returns the number of samples evicted from the front
+        """
+        count = len(timestamps)
+        if count == 0:
+            return 0
+        if self._tail + count > len(self._timestamps):
+            self._make_room(count)
+        self._timestamps[self._tail:self._tail + count] = timestamps
+        self._values[self._tail:self._tail + count] = values
+        self._tail += count
+        self.version += 1
+        return self._trim()
+
+    def _make_room(self, count: int) -> None:
+        """
+        Make space for count more samples at the tail, by moving the live window
+        back to the front of the storage or by growing the storage when that is not enough
+        """
+        live = self._tail - self._head
+        capacity = len(self._timestamps)
+        if live + count > capacity // 2:
+            capacity = max(2 * capacity, live + count)
+            timestamps = np.empty(capacity, dtype=np.float64)
+            values = np.empty(capacity, dtype=self._values.dtype)
+            timestamps[:live] = self._timestamps[self._head:self._tail]
+            values[:live] = self._values[self._head:self._tail]
+            self._timestamps = timestamps
+            self._values = values
+        else:
+            self._timestamps[:live] = self._timestamps[self._head:self._tail]
+            self._values[:live] = self._values[self._head:self._tail]
+        self._head = 0
+        self._tail = live
+
+    def _trim(self, exact: bool = False) -> int:
+        """
+        Apply the retention policy and return the number of evicted samples.
+        Unless exact is set, nothing is evicted before a limit is overshot by its slack.
+        """
+        head = self._head
+        tail = self._tail
+        if self._max_points is not None:
+            limit = self._max_points if exact else self._max_points + max(1, self._max_points // 10)
+            if tail - head > limit:
+                head = tail - self._max_points
+        if self._max_age_ms is not None and tail > head:
+            oldest_allowed = self._timestamps[tail - 1] - self._max_age_ms
+            slack = 0.0 if exact else self._max_age_ms / 10
+            if self._timestamps[head] < oldest_allowed - slack:
+                head += int(np.searchsorted(self._timestamps[head:tail], oldest_allowed, side='left'))
+        evicted = head - self._head
+        self._head = head
+        self._dropped += evicted
+        return evicted
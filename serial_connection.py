@@ -0,0 +1,56 @@
+from PySide6.QtCore import (QObject, Signal, Slot)
+import protocol_parser
+from serial_reader import SerialReader
+from transmit_queue import TransmitQueue
+
+
+class SerialConnection(QObject):
+    """
+    One controller connected on a serial port, with its own acquisition and transmit threads.
+    Ports are given a slot when connected, which namespaces the ids of their nodes
+    (see protocol_parser.nodes_per_port), so the frames of every port feed the same GraphManager.
+    Readers of different ports run concurrently, each one decoding its frames in its own thread.
+    """
+    connectionErrorSignal = Signal(int, str)
+
+    def __init__(self, port_name: str, port_slot: int, parent=None):
+        super().__init__(parent)
+        import serial
+        self.port_name = port_name
+        self.port_slot = port_slot
+        self.node_offset = protocol_parser.global_node_id(port_slot, 0)
+        self.serialPort = serial.Serial(port_name, 115200, timeout=0.1)
+        self.reader = SerialReader(self.serialPort, self, self.node_offset)
+        self.transmitQueue = TransmitQueue(self.serialPort, node_offset=self.node_offset, parent=self)
+        self.reader.serialErrorSignal.connect(self.onError)
+        self.transmitQueue.transmitErrorSignal.connect(self.onError)
+
+    @property
+    def label(self) -> str:
+        return f"Port {self.port_slot + 1} ({self.port_name})"
+
+    def start(self) -> None:
+        self.reader.start()
+        self.transmitQueue.start()
+
+    @Slot(str)
+    def onError(self, error: str) -> None:
+        """
+        The reader or the transmit thread lost access to the port, both may report it
+        """
+        if self.serialPort is not None:
+            self.connectionErrorSignal.emit(self.port_slot, error)
+
+    def close(self) -> None:
+        """
+        Stop both threads, writing the commands still queued, then close the port
+        """
+        if self.serialPort is None:
+            return
+        self.reader.stop()
+        self.transmitQueue.stop()
+        try:
+            self.serialPort.close()
+        except Exception:
+            pass
+        self.serialPort = None
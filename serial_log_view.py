@@ -0,0 +1,118 @@
+from PySide6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QPlainTextEdit,
+                               QCheckBox, QComboBox, QLineEdit)
+from PySide6.QtCore import (QTimer, Slot)
+from collections import deque
+import protocol_parser
+
+# Kind given to the lines of frames sent to the controller
+SENT_FRAME = "Sent"
+
+
+class SerialLogView(QWidget):
+    """
+    Serial logging panel.
+    Lines are queued by add_lines and written to the text view in one batch per flush interval,
+    the view keeps at most max_lines lines and the queue never holds more than that either.
+    Logging can be paused and filtered by node id and frame kind.
+    Each line is given as a (frame kind, node id, text) tuple, the text being already formatted
+    by the producer, e.g. the serial reader thread.
+    """
+    def __init__(self, max_lines: int = 2000, flush_interval_ms: int = 100, parent=None):
+        super().__init__(parent)
+        self._maxLines = max_lines
+        self._pending = deque(maxlen=max_lines)
+        self._paused = False
+        self._nodeFilter = None
+        self._kindFilter = None
+
+        self._text = QPlainTextEdit(self)
+        self._text.setReadOnly(True)
+        self._text.setPlaceholderText("Serial Logging")
+        self._text.setMaximumBlockCount(max_lines)
+
+        self._pauseCheckBox = QCheckBox("Pause", self)
+        self._pauseCheckBox.toggled.connect(self.set_paused)
+
+        self._kindCombobox = QComboBox(self)
+        self._kindCombobox.addItem("All frames", userData=None)
+        for kind in protocol_parser.FrameKind:
+            self._kindCombobox.addItem(kind.name.replace("_", " ").capitalize(), userData=kind)
+        self._kindCombobox.addItem("Sent frames", userData=SENT_FRAME)
+        self._kindCombobox.currentIndexChanged.connect(self.kind_filter_changed)
+
+        self._nodeLineEdit = QLineEdit(self)
+        self._nodeLineEdit.setPlaceholderText("All nodes, e.g. 3 or Port 2 Node 3")
+        self._nodeLineEdit.textChanged.connect(self.node_filter_changed)
+
+        self._controlLayout = QHBoxLayout()
+        self._controlLayout.setContentsMargins(0, 0, 0, 0)
+        self._controlLayout.addWidget(self._pauseCheckBox)
+        self._controlLayout.addWidget(self._kindCombobox)
+        self._controlLayout.addWidget(self._nodeLineEdit)
+
+        self.layout = QVBoxLayout(self)
+        self.layout.setContentsMargins(0, 0, 0, 0)
+        self.layout.addLayout(self._controlLayout)
+        self.layout.addWidget(self._text)
+
+        self._flushTimer = QTimer(self)
+        self._flushTimer.timeout.connect(self.flush)
+        self._flushTimer.start(flush_interval_ms)
+
+    def add_lines(self, lines: list) -> None:
+        """
+        Queue (frame kind, node id, text) lines, they are shown on the next flush
+        """
+        if not self._paused:
+            self._pending.extend(lines)
+
+    def add_line(self, kind, node_id: int, text: str) -> None:
+        if not self._paused:
+            self._pending.append((kind, node_id, text))
+
+    def clear(self) -> None:
+        self._pending.clear()
+        self._text.clear()
+
+    @Slot()
+    def flush(self) -> None:
+        """
+        Write every queued line matching the filters with a single append
+        When they are enough to push every line out of the view, the view is cleared first,
+        which is much cheaper than letting it trim its lines one by one
+        """
+        if not self._pending:
+            return
+        kind_filter = self._kindFilter
+        node_filter = self._nodeFilter
+        lines = [text for kind, node_id, text in self._pending
+                 if (kind_filter is None or kind == kind_filter)
+                 and (node_filter is None or node_id == node_filter)]
+        self._pending.clear()
+        if len(lines) >= self._maxLines:
+            self._text.clear()
+        if lines:
+            self._text.appendPlainText("\n".join(lines))
+
+    @Slot(bool)
+    def set_paused(self, paused: bool) -> None:
+        """
+        While paused, incoming lines are dropped so the view can be read
+        """
+        self._paused = paused
+        self._pending.clear()
+
+    @Slot(int)
+    def kind_filter_changed(self, index: int) -> None:
+        self._kindFilter = self._kindCombobox.itemData(index)
+
+    @Slot(str)
+    def node_filter_changed(self, text: str) -> None:
+        """
+        The node is typed as its id on the first port or as the "Port N Node M" label of the lines,
+        intermediate input such as "Port 2" or "0", the controller itself, does not filter the lines
+        """
+        try:
+            self._nodeFilter = protocol_parser.parse_node_label(text)
+        except ValueError:
+            self._nodeFilter = None
@@ -0,0 +1,111 @@
+import time
+from PySide6.QtCore import (QThread, QDateTime, Signal)
+import protocol_parser
+import perf_stats
+from stoppable_thread import StoppableThreadMixin
+
+
+def decode_batch(now: QDateTime, frames: list, node_offset: int = 0) -> tuple[list, list]:
+    """
+    Decode frames received together into the batch format of framesReceivedSignal:
+    a list of (raw frame, FrameRecord) tuples and the serial log lines of these frames
+    node_offset turns the node ids of the controller into global node ids, see protocol_parser.nodes_per_port
+    """
+    batch = [(frame, protocol_parser.get_data_from_frame(frame)) for frame in frames]
+    if node_offset:
+        for frame, frame_record in batch:
+            frame_record.node_id += node_offset
+    timestamp = now.toString("hh:mm:ss.zzz")
+    log_lines = [(frame_record.kind, frame_record.node_id, f"{timestamp} {frame.hex(' ')}")
+                 for frame, frame_record in batch]
+    return batch, log_lines
+
+
+class SerialReader(StoppableThreadMixin, QThread):
+    """
+    Background acquisition thread for one serial port.
+    Every loop drains everything waiting in the OS buffer with a single bulk read,
+    splits it into frames, decodes them and hands the whole batch to the GUI thread
+    through a queued signal, so serial intake never waits for the GUI to paint.
+    A capture which can not be written anymore (disk full, ...) is detached and reported through
+    captureErrorSignal, acquisition goes on without it.
+    """
+    framesReceivedSignal = Signal(QDateTime, list, list)
+    serialErrorSignal = Signal(str)
+    captureErrorSignal = Signal(str)
+
+    def __init__(self, serial_port, parent=None, node_offset: int = 0):
+        super().__init__(parent)
+        self._serialPort = serial_port
+        self._nodeOffset = node_offset
+        self._running = False
+        self._decoder = protocol_parser.FrameDecoder()
+        self._captureWriter = None
+        # Bytes dropped by the decoder already counted in the performance statistics
+        self._droppedReported = 0
+
+    def setCaptureWriter(self, capture_writer):
+        """
+        Start recording every received frame to a raw capture, or stop when given None
+        The previous writer is returned so the caller can close it
+        """
+        previous, self._captureWriter = self._captureWriter, capture_writer
+        return previous
+
+    def run(self) -> None:
+        """
+        Acquisition loop.
+        When nothing is waiting we block for one frame (bounded by the port timeout),
+        otherwise we read everything available at once.
+        Each emitted batch is a list of (raw frame, FrameRecord) tuples
+        sharing the receive timestamp of the read they came from,
+        along with the serial log lines of these frames, formatted here to spare the GUI thread.
+        """
+        frame_length = protocol_parser.default_frame_length
+        while self._running:
+            try:
+                chunk = self._serialPort.read(max(self._serialPort.in_waiting, frame_length))
+            except Exception as e:
+                if self._running:
+                    self.serialErrorSignal.emit(str(e))
+                break
+            if not chunk:
+                continue
+            now = QDateTime.currentDateTime()
+            stats_enabled = perf_stats.enabled
+            if stats_enabled:
+                decode_start = time.perf_counter()
+            capture_writer = self._captureWriter
+            receive_ns = capture_writer.now_ns() if capture_writer is not None else None
+            frames = self._decoder.feed(chunk)
+            if frames:
+                batch, log_lines = decode_batch(now, frames, self._nodeOffset)
+            # Bytes are counted for every chunk, so garbage and partial frames show up as soon as they are read
+            if stats_enabled:
+                stats = perf_stats.stats
+                if frames:
+                    stats.record("decode", time.perf_counter() - decode_start)
+                    stats.count("frames_received", len(frames))
+                stats.count("bytes_read", len(chunk))
+                stats.count("bytes_dropped", self._decoder.dropped_bytes - self._droppedReported)
+                self._droppedReported = self._decoder.dropped_bytes
+            if capture_writer is not None:
+                try:
+                    capture_writer.write(frames, receive_ns)
+                except OSError as e:
+                    self.setCaptureWriter(None)
+                    self.captureErrorSignal.emit(str(e))
+            if not frames:
+                continue
+            if stats_enabled:
+                perf_stats.stats.count("batches_emitted")
+            self.framesReceivedSignal.emit(now, batch, log_lines)
+        self._running = False
+
+    def stop(self) -> None:
+        """
+        Ask the acquisition loop to finish and wait until the thread is done.
+        It returns at the latest after one port read timeout.
+        """
+        self._running = False
+        self.wait()
@@ -0,0 +1,279 @@
+"""
+Controller simulator for load testing, Linux only.
+
+It opens a pseudo-terminal and emulates the frame protocol of the pressure controller on it:
+cyclic node pressure and supply pressure frames at configurable rates, answers to the commands
+of the application and optionally corrupted bytes. Connect the application to the printed port,
+typed in the serial port combobox.
+
+    python simulator.py --nodes 16 --rate 100 --rate 3=1000 --error-rate 0.001
+"""
+import argparse
+import os
+import random
+import select
+import struct
+import time
+import tty
+import protocol_parser
+
+default_node_count = 16
+default_node_rate_hz = 10.0
+default_supply_rate_hz = 2.0
+default_atmosphere_rate_hz = 0.5
+default_supply_pressure = 8000.0
+default_atmosphere_pressure = 1013.0
+# Longest sleep of the simulation loop, it also bounds how late a command is answered
+_max_wait_s = 0.005
+# Pressure change per second of each valve status while in manual mode: close all, slow/fast/max empty, slow/fast/max fill
+_valve_rates = (0.0, -200.0, -1000.0, -4000.0, 200.0, 1000.0, 4000.0)
+# Time constant of the pressure regulation in automatic mode
+_regulation_tau_s = 2.0
+# A source late by more than this gives up the frames it missed instead of sending them in a burst
+_max_lag_s = 0.5
+
+
+def due_count(due: float, period_s: float, now: float) -> tuple[int, float]:
+    """
+    Number of frames of a periodic source due at now and the time its next frame is due
+    """
+    if now < due:
+        return 0, due
+    if now - due > _max_lag_s:
+        return 1, now + period_s
+    count = int((now - due) / period_s) + 1
+    return count, due + count * period_s
+
+
+class SimulatedNode:
+    """
+    Pressure controlled by one node: it converges towards the target in automatic mode
+    and follows the valve in manual mode
+    """
+    def __init__(self, node_id: int, rate_hz: float):
+        self.node_id = node_id
+        self.period_s = 1.0 / rate_hz if rate_hz > 0 else None
+        self.next_due = 0.0
+        self.target_pressure = 0.0
+        self.output_pressure = 0.0
+        self.manual_mode = False
+        self.valve_status = 0
+
+    def update(self, elapsed_s: float, supply_pressure: float) -> None:
+        if self.manual_mode:
+            self.output_pressure += _valve_rates[self.valve_status] * elapsed_s
+        else:
+            self.output_pressure += (self.target_pressure - self.output_pressure) * min(1.0, elapsed_s / _regulation_tau_s)
+        self.output_pressure = min(max(self.output_pressure, 0.0), supply_pressure)
+
+
+class ControllerSimulator:
+    """
+    Controller emulated on the master side of a pseudo-terminal.
+    Every loop iteration answers the commands received, then writes every frame due with a single write.
+    Writes never block: when the application does not read fast enough, the frames which do not fit
+    in the terminal buffer are dropped and counted, like a real link would lose them.
+    Errors are injected per frame with probability error_rate: a flipped byte, a missing byte or an extra byte.
+    """
+    def __init__(self, node_count: int = default_node_count,
+                 node_rate_hz: float = default_node_rate_hz,
+                 node_rates: dict = None,
+                 supply_rate_hz: float = default_supply_rate_hz,
+                 atmosphere_rate_hz: float = default_atmosphere_rate_hz,
+                 error_rate: float = 0.0,
+                 seed: int = None):
+        node_rates = node_rates or {}
+        self.nodes = {node_id: SimulatedNode(node_id, node_rates.get(node_id, node_rate_hz))
+                      for node_id in range(1, node_count + 1)}
+        self.supply_pressure = default_supply_pressure
+        self.atmosphere_pressure = default_atmosphere_pressure
+        self._supplyPeriod = 1.0 / supply_rate_hz if supply_rate_hz > 0 else None
+        self._atmospherePeriod = 1.0 / atmosphere_rate_hz if atmosphere_rate_hz > 0 else None
+        self._errorRate = error_rate
+        self._random = random.Random(seed)
+        self._commandBuffer = bytearray()
+        self.frames_sent = 0
+        self.bytes_dropped = 0
+        self.errors_injected = 0
+        self.commands_received = 0
+
+        self.master_fd, self.slave_fd = os.openpty()
+        # No echo nor character translation, the link carries binary frames
+        tty.setraw(self.slave_fd)
+        os.set_blocking(self.master_fd, False)
+        self.port_name = os.ttyname(self.slave_fd)
+
+    def close(self) -> None:
+        os.close(self.master_fd)
+        os.close(self.slave_fd)
+
+    def handle_command(self, command: bytes) -> bytes:
+        """
+        Apply one command frame and return the answer of the controller, if any
+        """
+        self.commands_received += 1
+        if command[1] == 0x05 and command[2] == 0x07:
+            node = self.nodes.get(command[3])
+            if node is not None:
+                node.target_pressure = struct.unpack_from('<f', command, 4)[0]
+            return b""
+        node = self.nodes.get(command[1])
+        if node is None:
+            return b""
+        code = command[2]
+        if code == 0x09:
+            node.manual_mode = True
+            return protocol_parser.feedback_frame(node.node_id, code, 0x00)
+        if code == 0x0B:
+            status = 0x00 if node.manual_mode else 0x01
+            node.manual_mode = False
+            node.valve_status = 0
+            return protocol_parser.feedback_frame(node.node_id, code, status)
+        if code == 0x0F:
+            if not node.manual_mode or command[3] >= len(_valve_rates):
+                return protocol_parser.feedback_frame(node.node_id, code, 0x01)
+            node.valve_status = command[3]
+            return protocol_parser.feedback_frame(node.node_id, code, 0x00)
+        if code == 0x0D:
+            cycle_ms = (command[4] << 8) | command[5]
+            node.period_s = cycle_ms / 1000 if command[3] == 0x01 and cycle_ms > 0 else None
+            node.next_due = time.monotonic()
+        return b""
+
+    def read_commands(self) -> bytes:
+        """
+        Read what the application sent and return the answers to the complete commands
+        Bytes before a command header are skipped
+        """
+        try:
+            self._commandBuffer += os.read(self.master_fd, 4096)
+        except (BlockingIOError, OSError):
+            return b""
+        answers = bytearray()
+        frame_length = protocol_parser.default_frame_length
+        while len(self._commandBuffer) >= frame_length:
+            if self._commandBuffer[0] != 0x06:
+                del self._commandBuffer[0]
+                continue
+            answers += self.handle_command(bytes(self._commandBuffer[:frame_length]))
+            del self._commandBuffer[:frame_length]
+        return bytes(answers)
+
+    def corrupt(self, frame: bytes) -> bytes:
+        if self._errorRate <= 0.0 or self._random.random() >= self._errorRate:
+            return frame
+        self.errors_injected += 1
+        position = self._random.randrange(len(frame))
+        error = self._random.randrange(3)
+        if error == 0:
+            return frame[:position] + bytes([frame[position] ^ (1 << self._random.randrange(8))]) + frame[position + 1:]
+        if error == 1:
+            return frame[:position] + frame[position + 1:]
+        return frame[:position] + bytes([self._random.randrange(256)]) + frame[position:]
+
+    def due_frames(self, now: float, elapsed_s: float) -> list[bytes]:
+        """
+        Frames whose period elapsed since the last call, so rates above the loop frequency are kept
+        """
+        frames = []
+        if self._atmospherePeriod is not None:
+            count, self._atmosphereDue = due_count(self._atmosphereDue, self._atmospherePeriod, now)
+            frames += [protocol_parser.atmosphere_pressure_frame(self.atmosphere_pressure)] * count
+        if self._supplyPeriod is not None:
+            count, self._supplyDue = due_count(self._supplyDue, self._supplyPeriod, now)
+            for _ in range(count):
+                frames.append(protocol_parser.supply_pressure_frame(self.supply_pressure + self._random.uniform(-20.0, 20.0)))
+        for node in self.nodes.values():
+            node.update(elapsed_s, self.supply_pressure)
+            if node.period_s is not None:
+                count, node.next_due = due_count(node.next_due, node.period_s, now)
+                frames += [protocol_parser.node_pressure_frame(node.node_id, node.output_pressure)] * count
+        return frames
+
+    def next_due(self) -> float:
+        dues = [node.next_due for node in self.nodes.values() if node.period_s is not None]
+        if self._supplyPeriod is not None:
+            dues.append(self._supplyDue)
+        if self._atmospherePeriod is not None:
+            dues.append(self._atmosphereDue)
+        return min(dues, default=time.monotonic() + _max_wait_s)
+
+    def run(self, duration_s: float = None, report_interval_s: float = 5.0) -> None:
+        start = last = last_report = time.monotonic()
+        self._supplyDue = self._atmosphereDue = start
+        for node in self.nodes.values():
+            node.next_due = start
+        frames_reported = 0
+        while duration_s is None or last - start < duration_s:
+            wait_s = min(max(self.next_due() - time.monotonic(), 0.0), _max_wait_s)
+            readable, _, _ = select.select([self.master_fd], [], [], wait_s)
+            output = bytearray(self.read_commands() if readable else b"")
+            now = time.monotonic()
+            frames = self.due_frames(now, now - last)
+            last = now
+            for frame in frames:
+                output += self.corrupt(frame)
+            self.frames_sent += len(frames)
+            if output:
+                try:
+                    written = os.write(self.master_fd, output)
+                except BlockingIOError:
+                    written = 0
+                self.bytes_dropped += len(output) - written
+            if report_interval_s and now - last_report >= report_interval_s:
+                rate = (self.frames_sent - frames_reported) / (now - last_report)
+                print(f"{self.frames_sent} frames sent ({rate:.0f}/s), {self.commands_received} commands received, "
+                      f"{self.errors_injected} errors injected, {self.bytes_dropped} bytes dropped", flush=True)
+                last_report = now
+                frames_reported = self.frames_sent
+
+
+def parse_node_rate(text: str) -> tuple[int, float]:
+    node_id, rate = text.split("=")
+    return int(node_id), float(rate)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Pressure controller simulator on a pseudo-terminal")
+    parser.add_argument("--nodes", type=int, default=default_node_count, help="number of nodes, numbered from 1")
+    parser.add_argument("--rate", action="append", default=[],
+                        help="node pressure frames per second, for all nodes (e.g. 100) or one node (e.g. 3=1000)")
+    parser.add_argument("--supply-rate", type=float, default=default_supply_rate_hz, help="supply pressure frames per second")
+    parser.add_argument("--atmosphere-rate", type=float, default=default_atmosphere_rate_hz,
+                        help="atmosphere pressure frames per second")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="probability of corrupting each frame")
+    parser.add_argument("--seed", type=int, default=None, help="seed of the error injection")
+    parser.add_argument("--duration", type=float, default=None, help="stop after this many seconds")
+    parser.add_argument("--link", default=None, help="also make the port available under this path")
+    args = parser.parse_args()
+
+    node_rate_hz = default_node_rate_hz
+    node_rates = {}
+    for rate in args.rate:
+        if "=" in rate:
+            node_id, node_rate = parse_node_rate(rate)
+            node_rates[node_id] = node_rate
+        else:
+            node_rate_hz = float(rate)
+
+    simulator = ControllerSimulator(args.nodes, node_rate_hz, node_rates, args.supply_rate,
+                                    args.atmosphere_rate, args.error_rate, args.seed)
+    port_name = simulator.port_name
+    if args.link:
+        if os.path.islink(args.link):
+            os.remove(args.link)
+        os.symlink(port_name, args.link)
+        port_name = args.link
+    print(f"Simulating {args.nodes} nodes on {port_name}", flush=True)
+    try:
+        simulator.run(args.duration)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        simulator.close()
+        if args.link and os.path.islink(args.link):
+            os.remove(args.link)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,11 @@
+class StoppableThreadMixin:
+    """
+    Mixin of the threads whose loop runs while _running is set, to put before QThread or threading.Thread.
+    start() sets the flag before the thread runs, so a stop() clearing it right after start() is never lost
+    and the loop does not start at all.
+    """
+    _running = False
+
+    def start(self, *args) -> None:
+        self._running = True
+        super().start(*args)
@@ -0,0 +1,16 @@
+from csv_log_writer import CsvLogWriter
+
+
+def test_failing_file_is_reported_once_and_others_are_written(tmp_path):
+    errors = []
+    writer = CsvLogWriter(str(tmp_path), on_error=lambda path, error: errors.append(path))
+    # A directory in place of the file of the first log makes opening it fail
+    failing_path = writer.path_for("Node 1")
+    (tmp_path / failing_path).mkdir()
+    for i in range(100):
+        writer.write("Node 1", 1_000_000 + i, 1.0, 2.0, 3.0)
+        writer.write("Node 2", 1_000_000 + i, 1.0, 2.0, 3.0)
+    writer.close()
+    assert errors == [failing_path]
+    with open(writer.path_for("Node 2")) as log_file:
+        assert len(log_file.readlines()) == 100
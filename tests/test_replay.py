@@ -0,0 +1,33 @@
+import protocol_parser
+import capture
+import replay
+
+
+def replayed_node_ids(path) -> list:
+    source = replay.open_session(str(path))
+    node_ids = []
+    source.framesReceivedSignal.connect(
+        lambda now, batch, log_lines: node_ids.extend(record.node_id for frame, record in batch))
+    source.emit_frames(0, len(source))
+    return node_ids
+
+
+def record(path, port_slot: int = 0):
+    writer = capture.CaptureWriter(str(path), port_slot=port_slot)
+    writer.write([protocol_parser.supply_pressure_frame(2.0), protocol_parser.node_pressure_frame(3, 1.5)])
+    writer.close()
+
+
+def test_capture_of_the_second_port_replays_on_its_nodes(tmp_path):
+    path = tmp_path / "session.ppcap"
+    record(path, port_slot=1)
+    assert replayed_node_ids(path) == [protocol_parser.global_node_id(1, 0), protocol_parser.global_node_id(1, 3)]
+
+
+def test_port_of_a_capture_without_it_is_taken_from_its_name(tmp_path):
+    path = tmp_path / "session_port2.ppcap"
+    record(path)
+    assert replayed_node_ids(path) == [protocol_parser.global_node_id(1, 0), protocol_parser.global_node_id(1, 3)]
+    path = tmp_path / "session.ppcap"
+    record(path)
+    assert replayed_node_ids(path) == [0, 3]
@@ -0,0 +1,47 @@
+import threading
+import time
+from serial_reader import SerialReader
+from stoppable_thread import StoppableThreadMixin
+
+
+class IdlePort:
+    """
+    Serial port receiving nothing, every read waits for its timeout
+    """
+    in_waiting = 0
+
+    def read(self, size: int) -> bytes:
+        time.sleep(0.01)
+        return b""
+
+
+class SlowStartReader(SerialReader):
+    def run(self) -> None:
+        # stop() is called before the loop first looks at the flag
+        time.sleep(0.05)
+        super().run()
+
+
+class SlowStartLoop(StoppableThreadMixin, threading.Thread):
+    def run(self) -> None:
+        time.sleep(0.05)
+        while self._running:
+            time.sleep(0.001)
+
+    def stop(self) -> None:
+        self._running = False
+        self.join(2)
+
+
+def test_stop_right_after_start_ends_a_qthread():
+    reader = SlowStartReader(IdlePort())
+    reader.start()
+    reader.stop()
+    assert reader.isFinished()
+
+
+def test_stop_right_after_start_ends_a_thread():
+    thread = SlowStartLoop()
+    thread.start()
+    thread.stop()
+    assert not thread.is_alive()
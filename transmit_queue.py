@@ -0,0 +1,206 @@
+import collections
+import queue
+import threading
+import time
+from PySide6.QtCore import (QThread, Signal)
+import protocol_parser
+import perf_stats
+from stoppable_thread import StoppableThreadMixin
+
+default_ack_timeout_s = 0.5
+default_retries = 2
+
+# Queued by acknowledge() and stop() to wake the writer thread up
+_WAKE = object()
+
+
+class Command:
+    """
+    Frame sent to a controller.
+    node_id is the global node id it is meant for, used to route it to its port and to log it,
+    the frame itself carrying the id on the controller.
+    ack_kind is the kind of the feedback frame answering it, None when the controller does not answer.
+    attempts counts the writes of the frame, sent_time is the perf_counter time of the last one.
+    """
+    __slots__ = ("frame", "node_id", "description", "ack_kind", "attempts", "sent_time", "deadline")
+
+    def __init__(self, frame: bytes, node_id: int = None, description: str = ""):
+        self.frame = frame
+        self.node_id = node_id
+        self.description = description
+        self.ack_kind = protocol_parser.expected_feedback(frame)
+        self.attempts = 0
+        self.sent_time = 0.0
+        self.deadline = 0.0
+
+    @property
+    def key(self) -> tuple:
+        """
+        Commands are matched with their feedback frame on (feedback kind, node)
+        """
+        return self.ack_kind, self.frame[1]
+
+    def __repr__(self) -> str:
+        return f"Command({self.frame.hex(' ')}, node_id={self.node_id}, attempts={self.attempts})"
+
+
+class TransmitQueue(StoppableThreadMixin, QThread):
+    """
+    Background thread writing the commands to the serial port, so the GUI never waits for the port.
+    send() only queues a command. Every loop writes all the commands queued since the previous one
+    with a single write and reports them through framesSentSignal for the serial log.
+    Commands answered by a feedback frame are tracked until acknowledge() receives it: a command
+    not answered within ack_timeout_s is written again up to retries times, then reported through
+    commandFailedSignal. A single command per (feedback kind, node) waits for its answer at a time,
+    the following ones wait in order behind it, so every feedback matches exactly one command.
+    Feedback frames carry global node ids, node_offset being the one of the port, see protocol_parser.nodes_per_port.
+    """
+    framesSentSignal = Signal(list)
+    commandFailedSignal = Signal(object)
+    transmitErrorSignal = Signal(str)
+
+    def __init__(self, serial_port, ack_timeout_s: float = default_ack_timeout_s,
+                 retries: int = default_retries, node_offset: int = 0, parent=None):
+        super().__init__(parent)
+        self._serialPort = serial_port
+        self._nodeOffset = node_offset
+        self.ack_timeout_s = ack_timeout_s
+        self.retries = retries
+        self._queue = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        # Command waiting for its feedback and the commands queued behind it, keyed on Command.key
+        self._inFlight = {}
+        self._waiting = collections.defaultdict(collections.deque)
+        self._running = False
+
+    def send(self, command: Command) -> None:
+        """
+        Queue a command, callable from any thread
+        """
+        self._queue.put(command)
+
+    def pending_count(self) -> int:
+        """
+        Commands waiting for a feedback or queued behind one
+        """
+        with self._lock:
+            return len(self._inFlight) + sum(len(waiting) for waiting in self._waiting.values())
+
+    def acknowledge(self, frame_record: protocol_parser.FrameRecord):
+        """
+        Match a feedback frame with the command waiting for it.
+        Returns that command, or None for a feedback nobody waits for (late answer to a retried command,
+        command sent by another host). The next command waiting on the same key is then written.
+        """
+        key = (frame_record.kind, frame_record.node_id - self._nodeOffset)
+        with self._lock:
+            command = self._inFlight.pop(key, None)
+            if command is None:
+                return None
+            waiting = self._waiting.get(key)
+            if waiting:
+                self._inFlight[key] = waiting.popleft()
+                if not waiting:
+                    del self._waiting[key]
+        if perf_stats.enabled:
+            perf_stats.stats.count("commands_acknowledged")
+            perf_stats.stats.record("command_round_trip", time.perf_counter() - command.sent_time)
+        self._queue.put(_WAKE)
+        return command
+
+    def _next_timeout(self, now: float) -> float:
+        with self._lock:
+            deadline = min((command.deadline for command in self._inFlight.values()), default=now + 0.1)
+        return min(max(deadline - now, 0.0), 0.1)
+
+    def _due_commands(self, queued: list, now: float) -> tuple[list, list]:
+        """
+        Commands to write now and commands given up: the new commands without feedback, the commands
+        reaching the head of their key and the commands whose feedback timed out
+        """
+        to_send = []
+        failed = []
+        with self._lock:
+            for command in queued:
+                if command.ack_kind is None:
+                    to_send.append(command)
+                elif command.key in self._inFlight:
+                    self._waiting[command.key].append(command)
+                else:
+                    self._inFlight[command.key] = command
+            for key, command in list(self._inFlight.items()):
+                if command.attempts and now < command.deadline:
+                    continue
+                if command.attempts > self.retries:
+                    failed.append(command)
+                    waiting = self._waiting.get(key)
+                    if waiting:
+                        self._inFlight[key] = waiting.popleft()
+                        to_send.append(self._inFlight[key])
+                        if not waiting:
+                            del self._waiting[key]
+                    else:
+                        del self._inFlight[key]
+                    continue
+                to_send.append(command)
+            for command in to_send:
+                command.attempts += 1
+                command.sent_time = now
+                command.deadline = now + self.ack_timeout_s
+        return to_send, failed
+
+    def run(self) -> None:
+        while self._running:
+            try:
+                queued = [self._queue.get(timeout=self._next_timeout(time.perf_counter()))]
+            except queue.Empty:
+                queued = []
+            while True:
+                try:
+                    queued.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            to_send, failed = self._due_commands([item for item in queued if item is not _WAKE], time.perf_counter())
+            if to_send:
+                try:
+                    self._serialPort.write(b"".join(command.frame for command in to_send))
+                except Exception as e:
+                    if self._running:
+                        self.transmitErrorSignal.emit(str(e))
+                    self._running = False
+                    return
+                if perf_stats.enabled:
+                    perf_stats.stats.count("commands_sent", len(to_send))
+                    perf_stats.stats.count("command_retries", sum(command.attempts > 1 for command in to_send))
+                self.framesSentSignal.emit(to_send)
+            for command in failed:
+                self.commandFailedSignal.emit(command)
+        self._running = False
+        self.write_remaining()
+
+    def write_remaining(self) -> None:
+        """
+        Write the commands queued after the last loop, their feedback is not waited for anymore
+        """
+        remaining = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _WAKE:
+                remaining.append(item)
+        if remaining:
+            try:
+                self._serialPort.write(b"".join(command.frame for command in remaining))
+            except Exception:
+                return
+            self.framesSentSignal.emit(remaining)
+
+    def stop(self) -> None:
+        """
+        Finish the thread once what is still queued is written and wait until it is done
+        """
+        self._running = False
+        self._queue.put(_WAKE)
+        self.wait()